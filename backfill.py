@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from extractors import extract_all
+from meetings import MEETINGS
+from models import Location
+
+
+class Backfill:
+    """Downloads every meeting email page by page and records the
+    locations found in each one into the location history
+    """
+    def __init__(self, bot, workers=8, history=None):
+        self.bot = bot
+        self.workers = workers
+        self.history = history or bot.history
+        self.local = threading.local()
+
+    def run(self) -> dict:
+        """Resumes from the checkpoint stored in the database, so an
+        interrupted backfill only downloads what it has not seen yet
+        """
+        checkpoint = self.bot.db.get_setting('backfill') or {'page_token': None, 'done': []}
+        page_token, done = checkpoint['page_token'], set(checkpoint['done'])
+        stats = {'fetched': 0, 'failed': 0, 'locations': 0, 'start': time.perf_counter()}
+
+        pages = self.bot.gmail.list_message_pages(self.bot.gmail.authorize(), page_token)
+        with ThreadPoolExecutor(self.workers) as pool:
+            for messages, next_page_token in pages:
+                ids = [message['id'] for message in messages if message['id'] not in done]
+                for msg_id, locations in zip(ids, pool.map(self.process, ids)):
+                    self.record(msg_id, locations, done, stats)
+                # the checkpoint stays before the first page with a failed
+                # message, so the next run lists that page again and retries it
+                if not stats['failed']:
+                    page_token = next_page_token
+                self.bot.db.set_setting('backfill', {'page_token': page_token, 'done': sorted(done)})
+                self.bot.db.flush()
+                self.report(stats)
+        return stats
+
+    def record(self, msg_id: str, locations: list, done: set, stats: dict) -> None:
+        if locations is None:
+            stats['failed'] += 1
+            return
+        for meeting_type, location in locations:
+            # emails come newest first, so a meeting already recorded, by an
+            # earlier page or by a live run, is from a newer email and is kept
+            self.history.append(meeting_type, location, replace=False)
+        done.add(msg_id)
+        stats['fetched'] += 1
+        stats['locations'] += len(locations)
+
+    def process(self, msg_id: str) -> list or None:
+        try:
+            message, headers = self.bot.gmail.get_email_info(self.service(), msg_id)
+        except Exception as e:
+            # retried already; left for the next run to pick up
+            print(f'Could not fetch message {msg_id}: {e}')
+            return None
+        locations = []
+        for meeting_type, found in extract_all(message).items():
+            if found is None:
+                continue
+            location = Location(self.bot.find_date(headers, MEETINGS[meeting_type].weekday), *found)
+            locations.append((meeting_type, {**location.to_dict(), 'email_id': msg_id}))
+        return locations
+
+    def service(self):
+        # every worker thread gets its own service and connection
+        if not hasattr(self.local, 'service'):
+            self.local.service = self.bot.gmail.build_service()
+        return self.local.service
+
+    def report(self, stats: dict) -> None:
+        elapsed = time.perf_counter() - stats['start']
+        rate = stats['fetched'] / elapsed if elapsed else 0
+        print(f"{stats['fetched']} messages ({stats['failed']} failed, {stats['locations']} locations) "
+              f"in {elapsed:.1f}s, {rate:.1f} messages/s")
@@ -0,0 +1,106 @@
+"""Multi-process stress benchmark for concurrent database access.
+
+Writer processes increment a shared counter inside write transactions,
+insert settings of their own and record sends in the ledger, while
+reader processes keep reading, the way cron runs and the Flask server
+share one database. Reports read latency, writer lock waits and checks
+that no update or insert was lost:
+
+    python -m benchmarks.db_contention --backend sqlite
+    python -m benchmarks.db_contention --backend json
+"""
+from multiprocessing import Process, Queue
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from storage import SQLiteStorage, TinyDBStorage
+
+
+def open_backend(backend: str, directory: str):
+    if backend == 'sqlite':
+        return SQLiteStorage(os.path.join(directory, 'db.sqlite3'))
+    return TinyDBStorage(os.path.join(directory, 'db.json'))
+
+
+def writer(backend: str, directory: str, number: int, increments: int, results: Queue) -> None:
+    storage = open_backend(backend, directory)
+    start = time.perf_counter()
+    for i in range(increments):
+        with storage.transaction():
+            storage.set_setting('counter', (storage.get_setting('counter') or 0) + 1)
+        storage.save_meeting('conversations', {'sent': True})
+        # new documents, which every writer inserts at the same time
+        storage.set_setting(f'writer-{number}-{i}', i)
+        storage.record_send('conversations', f'writer-{number}-{i}', 'GroupMe')
+    waited = getattr(getattr(storage, 'lock', None), 'waited', 0.0)
+    results.put(('writer', time.perf_counter() - start, waited))
+
+
+def reader(backend: str, directory: str, duration: float, results: Queue) -> None:
+    storage = open_backend(backend, directory)
+    latencies = []
+    stop = time.perf_counter() + duration
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        storage.get_setting('counter')
+        storage.get_meeting('conversations')
+        latencies.append(time.perf_counter() - start)
+    results.put(('reader', latencies, None))
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['sqlite', 'json'], default='sqlite')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--increments', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        open_backend(args.backend, directory).set_setting('counter', 0)
+        results = Queue()
+        writers = [Process(target=writer, args=(args.backend, directory, number, args.increments, results))
+                   for number in range(args.writers)]
+        start = time.perf_counter()
+        for process in writers:
+            process.start()
+        readers = [Process(target=reader, args=(args.backend, directory, 2.0, results))
+                   for _ in range(args.readers)]
+        for process in readers:
+            process.start()
+        outcomes = [results.get() for _ in writers + readers]
+        for process in writers + readers:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        expected = args.writers * args.increments
+        storage = open_backend(args.backend, directory)
+        counter = storage.get_setting('counter')
+        inserted = [(storage.get_setting(f'writer-{number}-{i}') == i,
+                     storage.sent_services('conversations', f'writer-{number}-{i}') == ['GroupMe'])
+                    for number in range(args.writers) for i in range(args.increments)]
+        settings = sum(setting for setting, _ in inserted)
+        sends = sum(send for _, send in inserted)
+
+    latencies = [latency for kind, values, _ in outcomes if kind == 'reader' for latency in values]
+    waits = [waited for kind, _, waited in outcomes if kind == 'writer']
+    print(f'backend: {args.backend}, {args.writers} writers, {args.readers} readers, {elapsed:.2f}s')
+    print(f'writes: {expected / elapsed:.0f}/s, lock wait per writer: {statistics.mean(waits) * 1000:.1f} ms')
+    print(f'reads: {len(latencies)}, p50 {percentile(latencies, 0.5) * 1000:.2f} ms, '
+          f'p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {max(latencies) * 1000:.2f} ms')
+    print(f'counter: {counter} of {expected} ({"ok" if counter == expected else "LOST UPDATES"})')
+    print(f'inserted settings: {settings} of {expected} ({"ok" if settings == expected else "LOST INSERTS"})')
+    print(f'recorded sends: {sends} of {expected} ({"ok" if sends == expected else "LOST INSERTS"})')
+    return 0 if counter == settings == sends == expected else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
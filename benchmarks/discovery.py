@@ -0,0 +1,31 @@
+"""Reports cold and warm start times for building the Gmail service.
+
+Run from the repository root once credentials are set up:
+
+    python -m benchmarks.discovery
+"""
+import time
+
+from gmail import Gmail
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    gmail = Gmail()
+    gmail.discovery_cache.clear('gmail', 'v1')
+    cold = timed(lambda: gmail.authorize(refresh=True))
+    warm_disk = timed(lambda: Gmail().authorize())
+    warm_process = timed(gmail.authorize)
+
+    print(f'cold start (download discovery document): {cold * 1000:8.1f} ms')
+    print(f'warm start (cached discovery document):   {warm_disk * 1000:8.1f} ms')
+    print(f'warm start (reused service object):       {warm_process * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
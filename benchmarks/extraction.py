@@ -0,0 +1,207 @@
+"""Extraction benchmark over a synthetic corpus, checked against stored
+baselines.
+
+Measures emails per second through the whole path from a raw Gmail
+message to the meeting locations (`Gmail.get_text` then `extract_all`),
+the cost of each stage of it, and the time per MB of pathological
+inputs built to defeat the extractors. Every email's extracted locations
+are also checked against the ones it was generated with.
+
+Timings are compared to benchmarks/baselines/extraction.json after
+scaling by a calibration loop, so a baseline recorded on one machine
+holds on another. The script fails when a metric is slower than its
+baseline by more than the tolerance or an email is extracted wrongly:
+
+    python -m benchmarks.extraction
+    python -m benchmarks.extraction --update
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import time
+
+from benchmarks.generate import generate
+from extractors import EXTRACTORS, MATCHER, extract_all, normalize
+from gmail import Gmail
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'extraction.json')
+
+COUNT = 100
+SEED = 0
+
+# repeated up to the size of the input; each one hits the extractors' literals without a match
+PATHOLOGICAL = {
+    'near_misses': 'student leader meeting: monday, ',
+    'unterminated_conversations': 'cm "conversations" meeting: wednesday, august 23rd, 7 - 8:30 pm, walb ' + ' ' * 50,
+    'literal_flood': 'leader conversations ',
+    'quoted_lines': '\r\n> leader\r\n> conversations',
+    'no_literals': 'lorem ipsum dolor sit amet, consectetur adipiscing elit ',
+}
+PATHOLOGICAL_SIZE = 1024 * 1024
+
+
+def best_of(func, repeat: int) -> float:
+    # the fastest run is the one least disturbed by the rest of the machine
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def calibrate(repeat=3) -> float:
+    """Times a fixed pure-Python workload of string and dict operations,
+    used as the unit the other timings are scaled by
+    """
+    text = ' '.join(str(i) for i in range(20000))
+
+    def workload():
+        counts = {}
+        for word in text.split():
+            counts[word[-1]] = counts.get(word[-1], 0) + len(word.lower())
+        return text.find('not there'), counts
+    return best_of(workload, repeat)
+
+
+def encode(emails: list) -> list:
+    return [{'raw': base64.urlsafe_b64encode(email['raw']).decode('ascii')} for email in emails]
+
+
+def check(emails: list, gmail: Gmail) -> list:
+    """Returns the names of the emails whose extracted locations differ
+    from the ones they were generated with
+    """
+    wrong = []
+    for email, encoded in zip(emails, encode(emails)):
+        if extract_all(gmail.get_text(encoded)) != email['expected']:
+            wrong.append(email['name'])
+    return wrong
+
+
+def measure_corpus(emails: list, gmail: Gmail, repeat: int) -> dict:
+    """Returns the seconds per email of the whole path and of each stage
+    """
+    encoded = encode(emails)
+    messages = [gmail.parse_message(message) for message in encoded]
+    texts = [gmail.extract_text(message) for message in messages]
+    normalized = [normalize(text) for text in texts]
+    stages = {
+        'pipeline': lambda: [extract_all(gmail.get_text(message)) for message in encoded],
+        'stage.mime': lambda: [gmail.parse_message(message) for message in encoded],
+        'stage.text': lambda: [gmail.extract_text(message) for message in messages],
+        'stage.normalize': lambda: [normalize(text) for text in texts],
+        'stage.match': lambda: [MATCHER.match(text) for text in normalized],
+    }
+    for meeting_type, extractor in EXTRACTORS.items():
+        # the single-type path used by CMBot.extract_room
+        stages[f'stage.extract_{meeting_type.value}'] = \
+            lambda extractor=extractor: [extractor.extract(text) for text in normalized]
+    return {name: best_of(func, repeat) / len(emails) for name, func in stages.items()}
+
+
+def measure_pathological(repeat: int, size=PATHOLOGICAL_SIZE) -> dict:
+    """Returns the seconds per MB of extracting every meeting type from
+    each pathological input
+    """
+    timings = {}
+    for name, unit in PATHOLOGICAL.items():
+        message = (unit * (size // len(unit) + 1))[:size]
+        timings[f'pathological.{name}'] = best_of(lambda: extract_all(message), repeat) / (size / 1024 / 1024)
+    return timings
+
+
+def measure(emails: list, gmail: Gmail, rounds: int, repeat: int) -> (float, dict):
+    """Returns the median calibration and the median of every metric over
+    several rounds, so one disturbed round does not skew the result
+    """
+    calibrations, runs = [], []
+    for _ in range(rounds):
+        calibrations.append(calibrate(repeat))
+        runs.append({**measure_corpus(emails, gmail, repeat), **measure_pathological(repeat)})
+    return statistics.median(calibrations), {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+
+
+def compare(metrics: dict, calibration: float, baseline: dict, tolerance: float) -> list:
+    """Returns the metrics slower than their baseline by more than the
+    tolerance, once scaled to this machine's speed
+    """
+    scale = calibration / baseline['calibration']
+    regressions = []
+    for name, value in metrics.items():
+        expected = baseline['metrics'].get(name)
+        if expected is not None and value > expected * scale * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def load_baseline(path=BASELINE) -> dict or None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(metrics: dict, calibration: float, path=BASELINE) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    baseline = {
+        'calibration': calibration,
+        'corpus': {'count': COUNT, 'seed': SEED},
+        'metrics': metrics
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def report(metrics: dict, calibration: float, baseline: dict or None, regressions: list) -> None:
+    print(f"{1 / metrics['pipeline']:10.1f} emails/s")
+    scale = calibration / baseline['calibration'] if baseline else None
+    for name, value in metrics.items():
+        unit = 'ms/MB' if name.startswith('pathological.') else 'us/email'
+        value *= 1000 if unit == 'ms/MB' else 1000 * 1000
+        line = f'{name:40} {value:10.1f} {unit}'
+        if baseline and name in baseline['metrics']:
+            change = metrics[name] / (baseline['metrics'][name] * scale) - 1
+            line += f'  {change:+7.1%}' + ('  REGRESSION' if name in regressions else '')
+        print(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=3, help='Rounds of measurements; the median counts.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per metric in a round; the fastest one counts.')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed slowdown over the baseline, 0.5 for 50%%.')
+    parser.add_argument('--update', action='store_true', help='Store these timings as the new baseline.')
+    args = parser.parse_args()
+
+    gmail = Gmail()
+    emails = generate(COUNT, SEED)
+    wrong = check(emails, gmail)
+    calibration, metrics = measure(emails, gmail, args.rounds, args.repeat)
+
+    if args.update:
+        save_baseline(metrics, calibration)
+        baseline, regressions = None, []
+    else:
+        baseline = load_baseline()
+        regressions = compare(metrics, calibration, baseline, args.tolerance) if baseline else []
+    report(metrics, calibration, baseline, regressions)
+
+    if wrong:
+        print(f'Wrong locations extracted from {len(wrong)} emails: {", ".join(wrong)}')
+    if regressions:
+        print(f'{len(regressions)} metrics regressed by more than {args.tolerance:.0%}')
+    if args.update:
+        print(f'Stored the baseline in {BASELINE}')
+    elif baseline is None:
+        print('No baseline stored yet; run with --update to record one')
+    return 1 if wrong or regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
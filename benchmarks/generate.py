@@ -0,0 +1,164 @@
+"""Generates synthetic Spiritual Cyber-Vitamin emails with known meeting
+locations, for benchmarking and checking the extraction.
+
+The emails vary in size, from a short note to a long newsletter, and in
+formatting: plain text, quoted-printable with soft line breaks, HTML
+only, text with an HTML alternative, forwarded with quoted lines, and
+with or without an attachment. Either meeting block may be missing, and
+the filler text is full of near misses. Writes .eml files that
+`benchmarks.replay --corpus` can replay:
+
+    python -m benchmarks.generate --count 50 --out /tmp/corpus
+"""
+from datetime import date, timedelta
+from email import policy
+from email.message import EmailMessage
+import argparse
+import html
+import os
+import random
+import textwrap
+
+
+FORMATS = ['plain', 'quoted-printable', 'html', 'alternative', 'forwarded']
+
+# (paragraphs, weight): a short note, a regular newsletter and a long one
+SIZES = [((2, 6), 3), ((20, 60), 5), ((200, 600), 1)]
+
+WORDS = ('the a of and to in for is on that with as this be at by from we are you our will your have all '
+         'join us week campus ministry prayer service students pizza fellowship worship bible study retreat '
+         'volunteer food drive welcome back semester leader leaders meeting conversations room walb union '
+         'ballroom liberal arts monday wednesday pm noon').split()
+
+# room as written in the email, room as extracted
+STUDENT_LEADER_ROOMS = [('Walb Union, Room {}', 'Walb', ['226', '222', '110', 'G08']),
+                        ('Liberal Arts, Room {}', 'LA', ['G21', 'G08', '159']),
+                        ('L.A., Room {}', 'LA', ['G-21', 'G-08'])]
+
+CONVERSATIONS_ROOMS = [('Walb Classic Ballroom', 'Classic Ballroom'),
+                       ('Walb, Rooms 222-226', '222-226'),
+                       ('Walb, 222', '222-226')]
+
+
+def ordinal(day: int) -> str:
+    suffix = 'th' if 11 <= day % 100 <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f'{day}{suffix}'
+
+
+def long_date(day: date) -> str:
+    return f'{day:%A}, {day:%B} {ordinal(day.day)}'
+
+
+def student_leader_block(rng: random.Random, monday: date) -> (str, tuple):
+    label = rng.choice(['Student Leader Meeting', 'Student Leaders Meeting'])
+    hours = f"{rng.choice(['noon', '12'])} - {rng.choice(['1', '1:00'])} {rng.choice(['pm', 'p.m.'])}"
+    written, building, rooms = rng.choice(STUDENT_LEADER_ROOMS)
+    room = rng.choice(rooms)
+    return f'{label}: {long_date(monday)}, {hours}, {written.format(room)}', (building, room)
+
+
+def conversations_block(rng: random.Random, wednesday: date) -> (str, tuple):
+    prefix = rng.choice(['', "IPFW's ", 'IPFW’s '])
+    written, room = rng.choice(CONVERSATIONS_ROOMS)
+    start = rng.choice(['7', '7:00'])
+    return f'CM "Conversations" Meeting: {long_date(wednesday)}, {start} - 8:30 pm, {prefix}{written}', ('Walb', room)
+
+
+def paragraph(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(2, 6)):
+        words = rng.choices(WORDS, k=rng.randint(6, 18))
+        sentences.append(' '.join(words).capitalize() + '.')
+    return ' '.join(sentences)
+
+
+def generate_one(rng: random.Random, index: int) -> dict:
+    """Returns one email as raw bytes along with the meeting locations it
+    announces, in the shape `extract_all` returns them
+    """
+    monday = date(2015, 1, 5) + timedelta(weeks=rng.randrange(520))
+    (low, high), = rng.choices([size for size, _ in SIZES], weights=[weight for _, weight in SIZES])
+    paragraphs = [paragraph(rng) for _ in range(rng.randint(low, high))]
+    expected = {'student_leader': None, 'conversations': None}
+
+    blocks = []
+    if rng.random() < 0.75:
+        block, expected['student_leader'] = student_leader_block(rng, monday)
+        blocks.append(block)
+    elif rng.random() < 0.5:
+        blocks.append('No Student Leader Meeting this week.')
+    if rng.random() < 0.8:
+        block, expected['conversations'] = conversations_block(rng, monday + timedelta(days=2))
+        blocks.append(block)
+    for block in blocks:
+        # the meetings are usually near the top, but not always
+        position = rng.randint(0, min(len(paragraphs), 3) if rng.random() < 0.8 else len(paragraphs))
+        paragraphs.insert(position, block)
+
+    sent = monday + timedelta(days=1 if rng.random() < 0.1 else 0)
+    email_format = rng.choice(FORMATS)
+    message = build_message(paragraphs, blocks, email_format, sent)
+    if rng.random() < 0.2:
+        message.add_attachment(rng.randbytes(rng.randint(8, 256) * 1024), maintype='application',
+                               subtype='pdf', filename='flyer.pdf')
+    for part in message.walk():
+        if part.is_multipart():
+            # the default boundary is random, which would make the output differ between runs
+            part.set_boundary(f'=={rng.getrandbits(64):016x}==')
+    return {
+        'name': f'{index:04}-{email_format}.eml',
+        'format': email_format,
+        'raw': message.as_bytes(policy=policy.SMTP),
+        'expected': expected
+    }
+
+
+def build_message(paragraphs: list, blocks: list, email_format: str, sent: date) -> EmailMessage:
+    message = EmailMessage()
+    message['From'] = 'Campus Ministry <cm@example.com>'
+    message['Subject'] = 'Spiritual Cyber-Vitamin'
+    message['Date'] = f'{sent:%a, %d %b %Y} 08:00:00 -0400'
+    text = '\n\n'.join(paragraphs) + '\n'
+    page = '<html><body>%s</body></html>' % ''.join(f'<p>{html.escape(p, quote=False)}</p>\n' for p in paragraphs)
+    if email_format == 'plain':
+        # hard-wrapped meeting blocks are not extracted today, so only the filler is wrapped
+        wrapped = [p if p in blocks else textwrap.fill(p, 72) for p in paragraphs]
+        message.set_content('\n\n'.join(wrapped) + '\n', cte='8bit')
+    elif email_format == 'quoted-printable':
+        # one line per paragraph, so the encoder adds soft breaks inside the meeting blocks
+        message.set_content(text, cte='quoted-printable')
+    elif email_format == 'html':
+        message.set_content(page, subtype='html', cte='quoted-printable')
+    elif email_format == 'alternative':
+        message.set_content(text, cte='quoted-printable')
+        message.add_alternative(page, subtype='html', cte='quoted-printable')
+    elif email_format == 'forwarded':
+        lines = [line for p in paragraphs for line in textwrap.wrap(p, 60) + ['']]
+        quoted = '\n'.join('> ' + line if line else '>' for line in lines)
+        message.set_content(f'---------- Forwarded message ----------\n{quoted}\n', cte='8bit')
+    return message
+
+
+def generate(count: int, seed=0) -> list:
+    """Builds `count` emails; the same seed always gives the same emails
+    """
+    rng = random.Random(seed)
+    return [generate_one(rng, index) for index in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help='Directory the .eml files are written to.')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for email in generate(args.count, args.seed):
+        with open(os.path.join(args.out, email['name']), 'wb') as f:
+            f.write(email['raw'])
+    print(f'Wrote {args.count} emails to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Compares the MIME parsing of Gmail.get_text with the previous
+whole-message decode and BeautifulSoup pass.
+
+Each message under tests/emails is wrapped in a realistic raw email: a
+quoted-printable text part, an HTML alternative and an attachment. The
+script reports parse time and peak memory for both paths:
+
+    python -m benchmarks.mime
+    python -m benchmarks.mime --attachment-kb 4096
+"""
+from email.message import EmailMessage
+import argparse
+import base64
+import glob
+import os
+import time
+import tracemalloc
+
+from gmail import Gmail
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = """Student Leader Meeting: Monday, August 21st, noon - 1 pm, Walb Union, Room 226
+CM "Conversations" Meeting: Wednesday, August 23rd, 7 - 8:30 pm, IPFW's Walb Classic Ballroom
+"""
+
+
+def legacy_get_text(encoded_message: dict) -> str:
+    """The parsing path Gmail.get_text used before the MIME pipeline
+    """
+    from bs4 import BeautifulSoup
+    message = str(base64.urlsafe_b64decode(encoded_message['raw']), 'utf-8')
+    message = message.replace('=\r\n', '').replace('=22', '"').replace('=46', 'F').lower()
+    return BeautifulSoup(message, 'html.parser').text
+
+
+def load_messages() -> dict:
+    messages = {}
+    for path in sorted(glob.glob(os.path.join(ROOT, 'tests', 'emails', '*', 'message'))):
+        with open(path) as f:
+            messages[os.path.basename(os.path.dirname(path))] = f.read()
+    return messages or {'sample': SAMPLE}
+
+
+def build_raw(text: str, attachment_kb: int) -> dict:
+    message = EmailMessage()
+    message['Subject'] = 'Spiritual Cyber-Vitamin'
+    message['Date'] = 'Mon, 21 Aug 2017 08:00:00 -0400'
+    message.set_content(text, cte='quoted-printable')
+    message.add_alternative(f'<html><body><pre>{text}</pre></body></html>', subtype='html')
+    message.add_attachment(os.urandom(attachment_kb * 1024), maintype='application', subtype='pdf',
+                           filename='flyer.pdf')
+    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('ascii')}
+
+
+def measure(parse, encoded_message: dict, repeat: int) -> (float, float):
+    # warm up, so imports done on first use are not counted
+    parse(encoded_message)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(encoded_message)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parse(encoded_message)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attachment-kb', type=int, default=1024)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    gmail = Gmail()
+    paths = {'legacy': legacy_get_text, 'mime': gmail.get_text}
+    for name, text in load_messages().items():
+        encoded_message = build_raw(text, args.attachment_kb)
+        print(f'{name} ({len(encoded_message["raw"]) // 1024} KiB encoded)')
+        for path, parse in paths.items():
+            elapsed, peak = measure(parse, encoded_message, args.repeat)
+            print(f'  {path:7} {elapsed * 1000:9.2f} ms  peak {peak / 1024 / 1024:7.2f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+"""Offline end-to-end replay of recorded emails through `Main.main`.
+
+Starts a local stand-in for the Gmail API, the GroupMe bot endpoint and a
+Slack webhook, then replays every email of a corpus as if it had just
+arrived in a freshly set up install. Each meeting type is run once per
+email, the way cron would, with the clock pinned to the meeting's day.
+Reports the latency percentiles of the runs and the requests each run
+made to every endpoint:
+
+    python -m benchmarks.replay
+    python -m benchmarks.replay --corpus path/to/emails --repeat 5 --latency 50
+
+Runs are in-process, so interpreter startup and imports are not
+included; `benchmarks.startup` covers those.
+"""
+import argparse
+import base64
+from collections import Counter
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import io
+import re
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from cache import DiscoveryCache, MessageCache
+from credentials import CredentialManager, TokenStorage
+from main import Main, parse_args
+from meetings import MEETINGS
+from models import MeetingType as Type
+from outbox import OutboxDrainer
+from ratelimit import SharedRateLimiter
+from storage import SQLiteStorage
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+BOT_ID = 'replay-bot'
+
+
+class FakeServices:
+    """Local HTTP server answering the Gmail, GroupMe and Slack requests
+    the bot makes, counting each request by endpoint
+
+    The mailbox is a list of raw messages, newest last. Every delivered
+    message bumps the mailbox's historyId so incremental syncs see it.
+    An optional latency is added to every answer to stand in for the
+    network round trip.
+    """
+    ROUTES = [
+        ('GET', re.compile(r'/gmail/v1/users/me/profile$'), 'gmail.getProfile'),
+        ('GET', re.compile(r'/gmail/v1/users/me/messages$'), 'gmail.messages.list'),
+        ('GET', re.compile(r'/gmail/v1/users/me/messages/(?P<id>[^/]+)$'), 'gmail.messages.get'),
+        ('GET', re.compile(r'/gmail/v1/users/me/history$'), 'gmail.history.list'),
+        ('POST', re.compile(r'/gmail/v1/users/me/watch$'), 'gmail.watch'),
+        ('POST', re.compile(r'/v3/bots/post$'), 'groupme.post'),
+        ('POST', re.compile(r'/slack$'), 'slack.post')
+    ]
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.counts = Counter()
+        self.messages = []
+        self.history_id = 1000
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.services = self
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, name='fake-services', daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def deliver(self, raw: bytes) -> str:
+        with self.lock:
+            self.history_id += 1
+            msg_id = '%016x' % self.history_id
+            self.messages.append({'id': msg_id, 'history_id': self.history_id, 'raw': raw})
+            return msg_id
+
+    def reset(self) -> None:
+        with self.lock:
+            self.messages = []
+            self.counts = Counter()
+
+    def take_counts(self) -> Counter:
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            return counts
+
+    def answer(self, method: str, path: str, query: dict) -> (int, dict):
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                with self.lock:
+                    self.counts[name] += 1
+                    return getattr(self, name.replace('.', '_'))(query, **match.groupdict())
+        with self.lock:
+            self.counts['unexpected'] += 1
+        return 404, {'error': {'code': 404, 'message': f'{method} {path} is not faked'}}
+
+    def gmail_getProfile(self, query: dict) -> (int, dict):
+        return 200, {'emailAddress': 'cm@example.com', 'historyId': str(self.history_id)}
+
+    def gmail_messages_list(self, query: dict) -> (int, dict):
+        messages = [{'id': message['id'], 'threadId': message['id']} for message in reversed(self.messages)]
+        return 200, {'messages': messages, 'resultSizeEstimate': len(messages)}
+
+    def gmail_messages_get(self, query: dict, id: str) -> (int, dict):
+        for message in self.messages:
+            if message['id'] != id:
+                continue
+            if query.get('format') == ['metadata']:
+                headers = BytesParser(policy=policy.default).parsebytes(message['raw'], headersonly=True)
+                wanted = query.get('metadataHeaders', [])
+                return 200, {'id': id, 'threadId': id, 'payload': {'headers': [
+                    {'name': name, 'value': str(value)} for name, value in headers.items() if name in wanted]}}
+            return 200, {'id': id, 'threadId': id, 'raw': base64.urlsafe_b64encode(message['raw']).decode('ascii')}
+        return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+
+    def gmail_history_list(self, query: dict) -> (int, dict):
+        start = int(query['startHistoryId'][0])
+        history = [{'id': str(message['history_id']), 'messagesAdded': [{'message': {'id': message['id']}}]}
+                   for message in self.messages if message['history_id'] > start]
+        return 200, {'history': history, 'historyId': str(self.history_id)}
+
+    def gmail_watch(self, query: dict) -> (int, dict):
+        expiration = int((time.time() + 7 * 24 * 60 * 60) * 1000)
+        return 200, {'historyId': str(self.history_id), 'expiration': str(expiration)}
+
+    def groupme_post(self, query: dict) -> (int, dict):
+        return 202, {}
+
+    def slack_post(self, query: dict) -> (int, dict):
+        return 200, {}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.respond('GET')
+
+    def do_POST(self):
+        self.respond('POST')
+
+    def respond(self, method: str) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        url = urlsplit(self.path)
+        services = self.server.services
+        status, body = services.answer(method, url.path, parse_qs(url.query))
+        time.sleep(services.latency)
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_discovery_document() -> str:
+    """Returns the Gmail discovery document shipped with
+    google-api-python-client, so replays never download it
+    """
+    import googleapiclient
+    path = os.path.join(os.path.dirname(googleapiclient.__file__), 'discovery_cache', 'documents', 'gmail.v1.json')
+    with open(path) as f:
+        return f.read()
+
+
+def point_discovery_document(document: str, url: str) -> str:
+    document = json.loads(document)
+    for key in ['rootUrl', 'mtlsRootUrl', 'baseUrl']:
+        document[key] = f'{url}/'
+    return json.dumps(document)
+
+
+def fake_credentials(url: str):
+    from oauth2client import client
+    return client.OAuth2Credentials(
+        access_token='replay', client_id='replay', client_secret='replay', refresh_token='replay',
+        token_expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=1), token_uri=f'{url}/token', user_agent='CM Bot')
+
+
+class Replay:
+    """Replays each email of a corpus into a fresh install and times every
+    run of `Main.main` against the fake services
+    """
+    def __init__(self, emails: list, services: FakeServices, directory: str):
+        self.emails = emails
+        self.services = services
+        self.directory = directory
+        self.discovery_cache = DiscoveryCache(os.path.join(directory, 'cache'))
+        self.discovery_cache.set('gmail', 'v1', point_discovery_document(load_discovery_document(), services.url))
+        self.credential_path = os.path.join(directory, 'cm-bot.json')
+        TokenStorage(self.credential_path).put(fake_credentials(services.url))
+        self.quota = SharedRateLimiter(os.path.join(directory, 'quota.json'), 200, 200)
+
+    def run(self, repeat=1) -> list:
+        runs = []
+        for _ in range(repeat):
+            for name, raw in self.emails:
+                runs += self.replay(name, raw)
+        return runs
+
+    def replay(self, name: str, raw: bytes) -> list:
+        install = tempfile.mkdtemp(dir=self.directory)
+        storage = SQLiteStorage(os.path.join(install, 'db.sqlite3'))
+        storage.set_setting('prod', BOT_ID)
+        storage.set_setting('slack_url', f'{self.services.url}/slack')
+        self.services.reset()
+        self.services.deliver(raw)
+        runs = []
+        cwd = os.getcwd()
+        # Main keeps its database, history, outbox and metrics in the working directory
+        os.chdir(install)
+        try:
+            for key in MEETINGS:
+                runs.append(self.time_run(name, Type(key), install))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(install, ignore_errors=True)
+        return runs
+
+    def time_run(self, name: str, meeting_type: Type, install: str) -> dict:
+        args = vars(parse_args([f'--{meeting_type.value.replace("_", "-")}']))
+        start = time.perf_counter()
+        main = Main(args)
+        self.prepare(main, install)
+        output = io.StringIO()
+        try:
+            with redirect_stdout(output):
+                code = main.main()
+        except SystemExit as e:
+            code = e.code
+        seconds = time.perf_counter() - start
+        return {
+            'email': name,
+            'meeting_type': meeting_type.value,
+            'ok': not code,
+            'output': output.getvalue().strip(),
+            'seconds': seconds,
+            'requests': dict(self.services.take_counts())
+        }
+
+    def prepare(self, main: Main, install: str) -> None:
+        from notifier import Notifier
+        bot = main.bot
+        # every email is replayed as if today were the day of its meetings
+        bot.is_not_day = lambda day: False
+        bot.is_today = lambda day: True
+        gmail = bot.gmail
+        gmail.credential_dir = self.directory
+        gmail.credential_manager = CredentialManager(self.credential_path)
+        gmail.discovery_cache = self.discovery_cache
+        gmail.message_cache = MessageCache(os.path.join(install, 'messages'))
+        gmail.quota = self.quota
+        bot.notifier = Notifier(bot.id, bot.db.slack_url, groupme_url=f'{self.services.url}/v3/bots/post')
+        # deliver in-process, so the post is part of the timed run
+        main.start_drainer = lambda: OutboxDrainer(bot, timeout=0).drain()
+
+
+def load_corpus(directory: str) -> list:
+    emails = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.eml'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                emails.append((name, f.read()))
+    return emails
+
+
+def percentile(values: list, q: float) -> float:
+    # nearest rank
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(runs: list) -> dict:
+    latencies = [run['seconds'] * 1000 for run in runs]
+    requests = Counter()
+    for run in runs:
+        requests.update(run['requests'])
+    return {
+        'runs': len(runs),
+        'failed': sum(not run['ok'] for run in runs),
+        'latency_ms': {f'p{q}': round(percentile(latencies, q), 3) for q in [50, 90, 99]} | {'max': round(max(latencies), 3)},
+        'requests_per_run': {name: round(count / len(runs), 3) for name, count in sorted(requests.items())}
+    }
+
+
+def report(runs: list, summary: dict) -> None:
+    for run in runs:
+        requests = ', '.join(f'{name} {count}' for name, count in sorted(run['requests'].items())) or 'none'
+        status = 'ok' if run['ok'] else 'failed'
+        print(f"{run['email']:24} {run['meeting_type']:16} {run['seconds'] * 1000:8.1f} ms  {status:6}  {requests}")
+        if not run['ok'] and run['output']:
+            print(f"{'':42}{run['output']}")
+    print()
+    print(f"runs: {summary['runs']} ({summary['failed']} failed)")
+    print('latency: ' + '  '.join(f'{name} {value:.1f} ms' for name, value in summary['latency_ms'].items()))
+    print('requests per run:')
+    for name, count in summary['requests_per_run'].items():
+        print(f'  {name:24} {count:6.2f}')
+
+
+def replay(corpus=CORPUS, repeat=1, latency=0.0) -> list:
+    services = FakeServices(latency)
+    services.start()
+    directory = tempfile.mkdtemp()
+    try:
+        return Replay(load_corpus(corpus), services, directory).run(repeat)
+    finally:
+        services.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', default=CORPUS, help='Directory of .eml files to replay.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of times to replay the whole corpus.')
+    parser.add_argument('--latency', type=float, default=0, help='Milliseconds added to every fake answer.')
+    parser.add_argument('--json', action='store_true', help='Print the runs and the summary as JSON.')
+    args = parser.parse_args()
+
+    runs = replay(args.corpus, args.repeat, args.latency / 1000)
+    summary = summarize(runs)
+    if args.json:
+        print(json.dumps({'runs': runs, 'summary': summary}, indent=2))
+    else:
+        report(runs, summary)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+"""Startup-time benchmark for the commands that only touch the database.
+
+Runs each command under `python -X importtime` against a scratch
+database and fails when it imports one of the network dependencies or
+takes longer than the budget to import:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget 150
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from storage import SQLiteStorage
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOCAL_COMMANDS = [
+    ['--student-leader', '--last-location'],
+    ['--conversations', '--room-stats'],
+    ['--conversations', '--on', '2017-08-23']
+]
+
+HEAVY_MODULES = ['googleapiclient', 'apiclient', 'oauth2client', 'httplib2', 'bs4', 'requests', 'flask']
+
+
+def measure(command: list) -> dict:
+    """Runs main.py with the arguments and returns the modules it
+    imported with their cumulative import time in milliseconds
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        SQLiteStorage(os.path.join(directory, 'db.sqlite3')).set_setting('prod', 'bot-id')
+        result = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py'), *command],
+                                cwd=directory, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # keep the indentation, which shows how deeply nested the import is
+        modules[name[1:].rstrip()] = int(cumulative) / 1000
+    return modules
+
+
+def heavy_imports(modules: dict) -> list:
+    packages = {name.strip().split('.')[0] for name in modules}
+    return sorted(packages & set(HEAVY_MODULES))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=150, help='Import time budget per command in ms.')
+    args = parser.parse_args()
+
+    failed = False
+    for command in LOCAL_COMMANDS:
+        modules = measure(command)
+        # top-level imports are not indented, so their cumulative times add up to the total
+        total = sum(ms for name, ms in modules.items() if not name.startswith(' '))
+        heavy = heavy_imports(modules)
+        ok = total <= args.budget and not heavy
+        failed = failed or not ok
+        print(f"{' '.join(command):40} {total:7.1f} ms  {'ok' if ok else 'OVER BUDGET'}"
+              + (f"  imports {', '.join(heavy)}" if heavy else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import time
+
+from locking import atomic_write
+
+
+class DiscoveryCache:
+    """Versioned on-disk cache of Google API discovery documents
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_dir: str, ttl: int = 7 * 24 * 60 * 60):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def path(self, api: str, version: str) -> str:
+        return os.path.join(self.cache_dir, f'{api}-{version}.discovery.json')
+
+    def get(self, api: str, version: str) -> str or None:
+        try:
+            with open(self.path(api, version)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('format') != self.FORMAT_VERSION or self.is_expired(entry):
+            return None
+        return entry['document']
+
+    def is_expired(self, entry: dict) -> bool:
+        return time.time() - entry.get('fetched_at', 0) > self.ttl
+
+    def set(self, api: str, version: str, document: str) -> None:
+        self.make_cache_dir()
+        entry = {
+            'format': self.FORMAT_VERSION,
+            'fetched_at': time.time(),
+            'revision': json.loads(document).get('revision'),
+            'document': document
+        }
+        # a lost entry is downloaded again, so it is not synced to disk
+        atomic_write(self.path(api, version), json.dumps(entry), fsync=False)
+
+    def clear(self, api: str, version: str) -> None:
+        try:
+            os.remove(self.path(api, version))
+        except FileNotFoundError:
+            pass
+
+    def make_cache_dir(self) -> None:
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+
+class MessageCache:
+    """On-disk cache of raw Gmail messages keyed by message id
+
+    Gmail message ids are immutable, so a cached message never goes stale.
+    The SHA-256 of the raw content is stored alongside it and checked on
+    read so a truncated or corrupted entry is fetched again.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def path(self, msg_id: str) -> str:
+        return os.path.join(self.cache_dir, f'{msg_id}.json')
+
+    def get(self, msg_id: str) -> dict or None:
+        try:
+            with open(self.path(msg_id)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('sha256') != self.digest(entry.get('raw', '')):
+            return None
+        return entry
+
+    def set(self, msg_id: str, encoded_message: dict) -> None:
+        self.make_cache_dir()
+        entry = {**encoded_message, 'sha256': self.digest(encoded_message['raw'])}
+        # a lost or torn entry fails its checksum and is fetched again
+        atomic_write(self.path(msg_id), json.dumps(entry), fsync=False)
+
+    def __contains__(self, msg_id: str) -> bool:
+        return self.get(msg_id) is not None
+
+    def digest(self, raw: str) -> str:
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def make_cache_dir(self) -> None:
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
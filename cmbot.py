@@ -1,67 +1,87 @@
-from datetime import datetime, timedelta
-import urllib3
-import base64
+import calendar
+from datetime import date, timedelta
+from functools import cached_property
 import os
-import re
-import json
-import sys
-import pickle
-
-import certifi
-import requests
 
 from database import Database
-from gmail import Gmail
-from models import MeetingType as Type, Service
+from extractors import EXTRACTORS, extract_all, normalize
+from history import LocationHistory
+from meetings import MEETINGS
+from metrics import Metrics
+from models import MONTHS, Location, MeetingType as Type, Service
+from outbox import Outbox
+from storage import open_storage
 
 
 class CMBot:
-    def __init__(self, setup=False):
-        self.db = Database(setup)
-        self.id = self.db.get_bot_id()
-        self.slack_url = self.db.slack_url
-        self.gmail = Gmail()
-
-    def post(self, message: str) -> None:
-        # Uses SSL certification verification through certifi
-        self.post_to_groupme(message)
-        if self.slack_url:
-            self.post_to_slack(message)
-
-    def post_to_groupme(self, message: str) -> None:
-        requests.post('https://api.groupme.com/v3/bots/post', data=self.get_payload(Service.GROUPME, message))
-
-    def post_to_slack(self, message: str) -> None:
-        requests.post(self.slack_url, data=self.get_payload(Service.SLACK, message))
-
-    def get_payload(self, service: Service, message: str) -> dict:
-        if service == Service.GROUPME:
-            payload = {'bot_id': self.id, 'text': message}
-        elif service == Service.SLACK:
-            payload = {'payload': json.dumps({'text': message})}
-        return payload
-
-    def last_location(self, meeting_type: Type, sentence=False) -> str or dict:
-        location = self.db.last_location(meeting_type)
+    """The Gmail client and the notifier pull in googleapiclient, oauth2client,
+    httplib2, bs4 and requests, so they are only imported on first use and
+    commands that only read the database start quickly
+
+    The database, history and outbox live in `directory`, and the emails
+    are read from the Gmail `account`, so one process can run a bot per
+    tenant and one per shared mailbox.
+    """
+    def __init__(self, setup=False, write_behind=False, metrics=None, directory='.', account=None):
+        self.metrics = metrics or Metrics()
+        storage = open_storage(os.path.join(directory, 'db.json'), os.path.join(directory, 'db.sqlite3'))
+        self.db = Database(setup, storage, write_behind=write_behind)
+        self.history = LocationHistory(os.path.join(directory, 'history.sqlite3'))
+        self.outbox = Outbox(os.path.join(directory, 'outbox.sqlite3'))
+        self.account = account
+        if setup:
+            # prompt for the bot id, Slack URL and push topic during setup rather than on first use
+            self.id
+            self.notifier
+            self.db.push_topic
+
+    @cached_property
+    def id(self) -> str:
+        # read on first post, so a bot that only reads a mailbox needs none
+        return self.db.get_bot_id()
+
+    @cached_property
+    def gmail(self):
+        from gmail import Gmail
+        return Gmail(self.db, self.metrics, self.account)
+
+    @cached_property
+    def notifier(self):
+        from notifier import Notifier
+        return Notifier(self.id, self.db.slack_url)
+
+    @property
+    def slack_url(self) -> str:
+        return self.notifier.slack_url
+
+    def post(self, message: str, services: list = None) -> dict:
+        """Posts to the services, every configured one by default, at the
+        same time and returns whether each delivery succeeded
+        """
+        with self.metrics.span('post'):
+            return self.notifier.deliver(message, services)
+
+    def post_to_groupme(self, message: str) -> bool:
+        return self.notifier.send(Service.GROUPME, message)
+
+    def post_to_slack(self, message: str) -> bool:
+        return self.notifier.send(Service.SLACK, message)
+
+    def last_location(self, meeting_type: Type, sentence=False) -> str or Location:
+        location = self.db.last_location(meeting_type.value)
         if 'date' in location:
-            location['date'] = datetime.strptime('{month} {day}, {year}'.format_map(location['date']), '%b %d, %Y')
+            location = Location.from_dict(location)
             return self.build_sentence(location) if sentence else location
 
-    def build_sentence(self, location: dict) -> str:
-        if {'building', 'room'} <= set(location):
-            return 'The {date.month}/{date.day} meeting was held in {building} {room}'.format_map(location)
-        return 'There was no meeting on {date.month}/{date.day}'.format_map(location)
-
-    def update_location(self, location: dict, meeting_type: Type) -> None:
-        location['date'] = self.date_to_dict(location['date'])
-        location['meeting_type'] == location['meeting_type'].value
-        self.db.update_location(location, meeting_type)
+    def build_sentence(self, location: Location) -> str:
+        if location.building and location.room:
+            return f'The {location.date.month}/{location.date.day} meeting was held in {location.building} {location.room}'
+        return f'There was no meeting on {location.date.month}/{location.date.day}'
     
     def check_for_early_exit(self, meeting_type) -> None:
         try:
             self.check_message_sent_today(meeting_type)
-            self.check_no_student_leader_meeting_today(meeting_type)
-            self.check_no_conversations_meeting_today(meeting_type)
+            self.check_no_meeting_today(meeting_type)
         except Exception as e:
             print(e)
             location = self.last_location(meeting_type, sentence=True)
@@ -70,181 +90,102 @@ class CMBot:
             exit(1)
 
     def check_message_sent_today(self, meeting_type: Type) -> None:
-        if self.db.message_sent_today(meeting_type):
+        if self.db.message_sent_today(meeting_type.value):
             raise Exception('Message already sent') 
 
-    def check_no_student_leader_meeting_today(self, meeting_type: Type) -> None:
-        if meeting_type == Type.STUDENT_LEADER and self.is_not_day('Monday'):
-            raise Exception('No Student Leader meeting scheduled today')
+    def check_no_meeting_today(self, meeting_type: Type) -> None:
+        meeting = MEETINGS[meeting_type.value]
+        if self.is_not_day(calendar.day_name[meeting.weekday]):
+            raise Exception(f'No {meeting.name} meeting scheduled today')
     
     def is_not_day(self, day: str) -> bool:
-        return datetime.today().strftime('%A') != day
-
-    def check_no_conversations_meeting_today(self, meeting_type: type) -> None:
-        if meeting_type == Type.CONVERSATIONS and self.is_not_day('Wednesday'):
-            raise Exception('No Conversations meeting scheduled today')
+        return date.today().strftime('%A') != day
 
     def find_location(self, meeting_type: Type) -> dict:
         self.check_for_early_exit(meeting_type)
+        return self.locate(meeting_type)
+
+    def locate(self, meeting_type: Type) -> dict:
+        """Finds today's meeting location in the latest email, raising
+        when the email does not announce a meeting for today
+
+        Every meeting type is extracted when an email is first parsed, so
+        once the latest parse covers today no Gmail request is made.
+        """
+        with self.metrics.span('database'):
+            parse = self.db.latest_parse()
+        if parse is None or not self.is_today(self.meeting_date(parse, meeting_type)):
+            parse = self.parse_latest_email()
+        return self.find_meeting_location(meeting_type, parse)
+
+    def parse_latest_email(self) -> dict:
         service = self.gmail.authorize()
-        email_id = self.gmail.get_last_email_id(service)
-        message, headers = self.gmail.get_email_info(service, email_id)
-        return self.find_meeting_location(meeting_type, message, headers)
+        with self.metrics.span('list'):
+            email_id = self.gmail.get_last_email_id(service)
+        with self.metrics.span('database'):
+            parse = self.db.get_parse(email_id)
+        if parse is None:
+            message, headers = self.gmail.get_email_info(service, email_id)
+            parse = self.parse_email(email_id, message, headers)
+        return parse
+
+    def parse_email(self, email_id: str, message: str, headers: list) -> dict:
+        """Extracts every meeting type from the email in one pass and
+        stores the result under the message id
+        """
+        with self.metrics.span('extract'):
+            parse = {'email_id': email_id,
+                     'date': self.find_date(headers).isoformat(),
+                     'locations': extract_all(message)}
+        with self.metrics.span('database'):
+            self.db.save_parse(email_id, parse)
+        return parse
+
+    def meeting_date(self, parse: dict, meeting_type: Type) -> date:
+        return self.correct_date(date.fromisoformat(parse['date']), MEETINGS[meeting_type.value].weekday)
+
+    def is_today(self, day: date) -> bool:
+        return date.today() == day
+
+    def find_meeting_location(self, meeting_type: Type, parse: dict) -> Location:
+        found = parse['locations'][meeting_type.value]
+        if not found:
+            raise Exception('No meeting location found in email')
+        meeting_date = self.meeting_date(parse, meeting_type)
+
+        if self.is_today(meeting_date):
+            location = Location(meeting_date, *found)
+            with self.metrics.span('database'):
+                self.db.update_location(location, meeting_type.value)
+            with self.metrics.span('history'):
+                self.record_history(meeting_type, location)
+            return location
 
-    def find_meeting_location(self, meeting_type: Type, message: str, headers: list) -> dict:
-        if meeting_type == Type.STUDENT_LEADER:
-            return self.find_student_leader_meeting(message, headers)
-        elif meeting_type == Type.CONVERSATIONS:
-            return self.find_conversations_meeting(message, headers)
+        raise Exception(f'No {MEETINGS[meeting_type.value].name} meeting scheduled today')
 
-    def correct_date(self, email_date: datetime, weekday: int) -> datetime:
+    def correct_date(self, email_date: date, weekday: int) -> date:
         # if the email isn't sent on Monday
         while email_date.weekday() != weekday:
             email_date += timedelta(days=1)
         return email_date
 
-    def date_to_dict(self, date: datetime) -> dict:
-        return dict(zip(['month', 'day', 'year'], date.strftime('%b %d %Y').split()))
-
-    def find_student_leader_meeting(self, message: str, headers: list) -> dict:
-        building, room = self.extract_student_leader_room(message)
-        email_date = self.find_date(headers, weekday=0)
-
-        if datetime.today().date() == email_date.date():
-            location = {'building': building, 'room': room, 'date': self.date_to_dict(email_date), 'sent': False}
-            self.db.update_location(location, Type.STUDENT_LEADER.value)
-            return location
-       
-        raise Exception('No Student Leader meeting scheduled today')
+    def record_history(self, meeting_type: Type, location: Location) -> None:
+        self.history.append(meeting_type.value, location.to_dict())
 
-    def extract_student_leader_room(self, message: str) -> (str, str):
+    def extract_room(self, meeting_type: Type, message: str) -> (str, str):
         """Finds the building and room number of the meeting
         """
-        pattern = re.compile("""
-        student
-        \s*
-        leader
-        s?                             # optional plural
-        \s*
-        meeting:
-        \s*
-        monday,                        # day of the week
-        \s*
-        \w+                            # month
-        \s*
-        \d\d?                          # day, optionally 1 digit
-        \w+                            # day ending ('st', 'th')
-        ,?                             # optional comma
-        \s*
-        (?:\w+|\d+)                    # starting time (noon or 12)
-        \s*
-        -
-        \s*
-        1(?::00)?                      # ending time (1 or 1:00)
-        \s*
-        p\.?m\.?,                      # 'pm' or 'p.m.'
-        \s*
-        (liberal\s*arts|l\.a\.|walb)   # building
-        \s*
-        \w*                            # extra info such as 'union' after 'walb'
-        \s*
-        \w*,
-        \s*
-        room
-        \s*
-        (
-        [g-]*                          # optional ground floor and hyphen ('G08', 'G-21')
-        \d{2}\d?                       # room number, max of 3 digits
-        )
-        """, re.X)
-        match = re.search(pattern, message)
-
-        if match and len(match.groups()) == 2:
-            return self.correct_student_leader_room(*match.groups())
+        location = EXTRACTORS[meeting_type].extract(normalize(message))
+        if location:
+            return location
         raise Exception('No meeting location found in email')
 
-    def correct_student_leader_room(self, building: str, room: str) -> (str, str):
-        return ('LA' if building in ['liberal arts', 'l.a.'] else building.capitalize()), room.capitalize()
-
-    def zero_pad(str, day: str) -> str:
-        if len(day) == 1:
-            day = '0' + day
-        return day
-
-    def find_date(self, headers: list, weekday: int) -> datetime:
+    def find_date(self, headers: list, weekday: int = None) -> date:
         """Uses the Gmail API to extract the header from the message
         and parse it for the date the email was sent.
         """
         for header in headers:
             if header['name'] == 'Date':
                 day, month, year = header['value'].split()[1:4]
-                day = self.zero_pad(day)
-                date = datetime.strptime(f'{month} {day}, {year}', '%b %d, %Y')
-                return self.correct_date(date, weekday)
-
-    def dict_to_date(self, date: datetime) -> dict:
-        return datetime.strptime('{month} {day}, {year}'.format_map(date), '%b %d, %Y')
-
-    def is_pizza_night(self, date: dict) -> bool:
-        weekday, day = [int(t) for t in self.dict_to_date(date).strftime('%w %d').split()]
-        return weekday == 3 and day - 7 <= 0
-
-    def find_conversations_meeting(self, message: str, headers: list) -> dict:    
-        building, room = self.extract_conversations_room(message)
-        email_date = self.find_date(headers, weekday=2)
-
-        if datetime.today().date() == email_date.date():
-            location = {'building': building, 'room': room, 'date': self.date_to_dict(email_date), 'sent': False}
-            self.db.update_location(location, Type.CONVERSATIONS.value)
-            return location
-
-        raise Exception('No Conversations meeting scheduled today')
-
-    def extract_conversations_room(self, message: str) -> (str, str):
-        """Finds the building and room number of the meeting
-        """
-        # remove unnecessary formatting
-        message = message.replace('=\r\n', '').replace('\r\n>', '')\
-                .replace('=22', '"').replace('=46', 'F').lower()
-
-        pattern = re.compile("""
-        cm
-        \s*
-        "conversations"
-        \s*
-        meeting:
-        \s*
-        wednesday         # day of the week
-        ,?
-        \s*
-        \w+               # month
-        \s*
-        \d\d?             # day, optionally 1 digit
-        \w+?              # optional day ending ('st', 'nd', 'th')
-        ,?
-        \s*
-        7(?::00)?         # starting time (7 or 7:30)
-        \s*
-        -
-        \s*
-        8:30              # ending time
-        \s*
-        p\.?m\.?,?          # 'pm' or 'p.m.'
-        \s*
-        (?:ipfw's\s*)?    # "IPFW's" Walb Class Ballroom
-        (walb)            # building (always Walb)
-        ,?
-        .*?
-        (222|ballroom)""", re.X)
-        match = pattern.search(message)
-
-        if match and len(match.groups()) == 2:
-            return self.correct_conversations_room(*match.groups())
-        raise Exception('No meeting location found in email')
-
-    def correct_conversations_room(self, building: str, room: str) -> (str, str):
-        if room == 'ballroom':
-            room = 'Classic Ballroom'
-        elif room == '222':
-            room = '222-226'
-        return building.capitalize(), room
+                sent = date(int(year), MONTHS[month], int(day))
+                return sent if weekday is None else self.correct_date(sent, weekday)
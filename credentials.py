@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+import os
+import threading
+
+from oauth2client import client
+import httplib2
+
+from locking import FileLock, atomic_write
+
+
+class TokenStorage(client.Storage):
+    """oauth2 credentials kept in a JSON file shared by every process
+
+    The file is locked across processes while a token is read or
+    refreshed, and replaced atomically, so a reader never sees half a
+    token and only one process refreshes at a time.
+    """
+    def __init__(self, path: str):
+        super().__init__(lock=FileLock(f'{path}.lock'))
+        self.path = path
+
+    def locked_get(self):
+        try:
+            with open(self.path) as f:
+                credentials = client.Credentials.new_from_json(f.read())
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        credentials.set_store(self)
+        return credentials
+
+    def locked_put(self, credentials) -> None:
+        atomic_write(self.path, credentials.to_json())
+
+    def locked_delete(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CredentialManager:
+    """Keeps the oauth2 credentials in memory and refreshes the access
+    token in a background thread shortly before it expires
+
+    A run that starts with a token about to expire refreshes it while the
+    Gmail service is being built, instead of failing its first request and
+    refreshing then. A long-lived process refreshes on a timer. When
+    another process has already refreshed the token, its token is read
+    from the file instead of asking Google for another one.
+    """
+    RETRY = 60
+
+    def __init__(self, path: str, margin=5 * 60):
+        self.storage = TokenStorage(path)
+        self.margin = margin
+        self.credentials = None
+        self.lock = threading.Lock()
+        self.refreshing = None
+        self.timer = None
+
+    def get(self):
+        """Returns the cached credentials, loading them on first use, or
+        None when there are no valid stored credentials
+        """
+        with self.lock:
+            if self.credentials is None:
+                self.credentials = self.storage.get()
+            if self.credentials is None or self.credentials.invalid:
+                return None
+            if self.expires_in(self.credentials) <= self.margin:
+                self.refresh_in_background()
+            elif self.timer is None:
+                self.schedule(self.expires_in(self.credentials) - self.margin)
+            return self.credentials
+
+    def use(self, credentials) -> None:
+        with self.lock:
+            self.credentials = credentials
+
+    def wait(self) -> None:
+        # lets a refresh started by get() finish before the first request
+        refreshing = self.refreshing
+        if refreshing is not None:
+            refreshing.join()
+
+    def expires_in(self, credentials) -> float:
+        if credentials.token_expiry is None:
+            return float('inf')
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return (credentials.token_expiry - now).total_seconds()
+
+    def refresh_in_background(self) -> None:
+        if self.refreshing is None or not self.refreshing.is_alive():
+            self.refreshing = threading.Thread(target=self.refresh, name='token-refresh', daemon=True)
+            self.refreshing.start()
+
+    def refresh(self) -> None:
+        self.storage.acquire_lock()
+        try:
+            stored = self.storage.locked_get()
+            if (stored and not stored.invalid and stored.access_token != self.credentials.access_token
+                    and self.expires_in(stored) > self.margin):
+                # another process refreshed it already; update in place so
+                # services authorized with these credentials see the new token
+                self.credentials._updateFromCredential(stored)
+            else:
+                self.credentials.refresh(httplib2.Http())
+        except Exception as e:
+            print(f'Could not refresh the access token: {e}')
+            self.schedule(self.RETRY)
+            return
+        finally:
+            self.storage.release_lock()
+        self.schedule(self.expires_in(self.credentials) - self.margin)
+
+    def schedule(self, delay: float) -> None:
+        if delay == float('inf'):
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = threading.Timer(max(0, delay), self.refresh_in_background)
+        self.timer.daemon = True
+        self.timer.start()
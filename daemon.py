@@ -0,0 +1,48 @@
+from datetime import datetime
+from functools import cached_property
+
+from main import Main
+from meetings import MEETINGS
+from models import MeetingType as Type
+from outbox import OutboxDrainer
+from scheduler import Scheduler
+
+
+class Daemon(Main, Scheduler):
+    """Runs the weekly checks from one long-lived process
+
+    The Gmail service, database and HTTP sessions stay warm between checks.
+    From the scheduled time on the day of a meeting the latest email is
+    polled with exponential backoff until it announces that day's meeting,
+    so the location is posted seconds after the email arrives. Queued
+    messages are delivered by a drainer thread instead of a new process.
+    """
+    write_behind = False
+
+    def __init__(self, args: dict, poll=30, max_poll=5 * 60):
+        Main.__init__(self, args)
+        Scheduler.__init__(self, poll, max_poll)
+
+    def schedule(self) -> dict:
+        return {Type(key): (Type(key), meeting.check_at) for key, meeting in MEETINGS.items() if meeting.check_at}
+
+    def check(self, due: list, now: datetime) -> None:
+        for meeting_type in due:
+            with self.metrics.run(meeting_type.value):
+                try:
+                    self.announce(meeting_type)
+                except Exception as e:
+                    self.retry(meeting_type, now, meeting_type.value, e)
+                    continue
+            self.succeeded(meeting_type)
+
+    @cached_property
+    def drainer(self) -> OutboxDrainer:
+        return OutboxDrainer(self.bot, timeout=0)
+
+    def start_drainer(self) -> None:
+        self.outbox_ready.set()
+
+    def drain(self) -> None:
+        with self.metrics.run('drain_outbox'):
+            self.drainer.drain()
@@ -1,46 +1,69 @@
-from tinydb import TinyDB, Query
+from datetime import date
+import secrets
+
+from models import Location, Service
+from storage import Storage, WriteBehindStorage, open_storage
+
+
+def meeting_key(meeting_type) -> str:
+    # callers pass either a MeetingType or its value; the storage binds strings
+    return getattr(meeting_type, 'value', meeting_type)
+
 
 class Database:
-    def __init__(self, setup=False):
-        self.db = TinyDB('db.json')
-        self.q = Query()
+    def __init__(self, setup=False, storage: Storage = None, write_behind=False):
+        self.db = storage or open_storage()
+        if write_behind:
+            self.db = WriteBehindStorage(self.db)
         self.setup = setup
     
     def last_location(self, meeting_type: str):
-        return self.db.get(self.q.type == meeting_type) or {}
+        return self.db.get_meeting(meeting_key(meeting_type)) or {}
     
     def meeting_type_exists(self, meeting_type: str):
-        return self.db.search(self.q.type == meeting_type)
+        return self.db.get_meeting(meeting_key(meeting_type)) is not None
 
-    def update_location(self, location: dict, meeting_type: str):
-        if self.meeting_type_exists(meeting_type):
-            self.db.update(location, self.q.type == meeting_type)
-        else:
-            self.db.insert({'type': meeting_type, **location})
+    def update_location(self, location: Location, meeting_type: str):
+        self.db.save_meeting(meeting_key(meeting_type), location.to_dict())
 
-    def message_sent_today(self, meeting_type: str):
-        return self.db.contains((self.q.type == meeting_type) & (self.q.sent == True))
+    def message_sent_today(self, meeting_type: str, day: date = None) -> bool:
+        """Whether every configured service has the meeting's message for
+        the day, looked up in the send ledger
+        """
+        return set(self.destinations()) <= set(self.sent_services(meeting_type, day))
 
-    def mark_as_sent(self, meeting_type: str):
-        self.db.update({'sent': True}, self.q.type == meeting_type)
-    
-    def clear_sent(self):
-        self.db.update({'sent': False}, (self.q.type == 'student_leader') | (self.q.type == 'conversations'))
+    def sent_services(self, meeting_type: str, day: date = None) -> list:
+        return self.db.sent_services(meeting_key(meeting_type), (day or date.today()).isoformat())
+
+    def record_send(self, meeting_type: str, meeting_date: str, service: str) -> bool:
+        return self.db.record_send(meeting_key(meeting_type), meeting_date, service)
+
+    def destinations(self) -> list:
+        # the services the notifier posts to, known without importing it
+        return [Service.GROUPME.value] + ([Service.SLACK.value] if self.get_setting('slack_url') else [])
+
+    def get_parse(self, email_id: str) -> dict or None:
+        return self.get_setting(f'email:{email_id}')
+
+    def save_parse(self, email_id: str, parse: dict):
+        """Stores the locations found in an email, and remembers it as the
+        latest one parsed
+        """
+        self.set_setting(f'email:{email_id}', parse)
+        self.set_setting('latest_email', email_id)
+
+    def latest_parse(self) -> dict or None:
+        email_id = self.get_setting('latest_email')
+        return email_id and self.get_parse(email_id)
 
     def get_bot_id(self, id_type='prod'):
-        if self.setup and not self.exists(id_type):
+        if self.setup or not self.exists(id_type):
             bot_id = self.prompt_user('Bot ID')
             self.insert_bot_id(id_type, bot_id)
-        elif self.setup and self.exists(id_type):
-            bot_id = self.prompt_user('Bot ID')            
-            self.db.update({id_type: bot_id}, self.q[id_type].exists())
-        elif not self.exists(id_type):
-            bot_id = self.prompt_user('Bot ID')
-            self.insert_bot_id(id_type, bot_id)
-        return self.db.get(self.q[id_type].exists())[id_type]
+        return self.get_setting(id_type)
     
     def insert_bot_id(self, id_type: str, bot_id: str):
-        self.db.insert({id_type: bot_id})
+        self.set_setting(id_type, bot_id)
                                                     
     def prompt_user(self, prompt: str, required=True):
         optional_tag = ' [optional]' if not required else ''
@@ -50,15 +73,38 @@ class Database:
         return result or None
     
     def exists(self, key: str):
-        return self.db.contains(self.q[key].exists())
+        return self.db.has_setting(key)
+
+    def get_setting(self, key: str):
+        return self.db.get_setting(key)
+
+    def set_setting(self, key: str, value):
+        self.db.set_setting(key, value)
+
+    def flush(self):
+        self.db.flush()
 
     @property
     def slack_url(self):
         key = 'slack_url'
-        if self.setup and not self.exists(key):
+        if self.setup:
             slack_url = self.prompt_user('Slack URL', required=False)
-            self.db.insert({key: slack_url})
-        elif self.setup and self.exists(key):
-            slack_url = self.prompt_user('Slack URL', required=False)            
-            self.db.update({key: slack_url}, self.q[key].exists())
-        return (self.db.get(self.q[key].exists()) or {}).get(key, None)
+            self.set_setting(key, slack_url)
+        return self.get_setting(key)
+
+    @property
+    def push_topic(self):
+        # Pub/Sub topic Gmail publishes inbox changes to, e.g. projects/cm-bot/topics/gmail
+        key = 'push_topic'
+        if self.setup:
+            push_topic = self.prompt_user('Pub/Sub topic for push notifications', required=False)
+            self.set_setting(key, push_topic)
+        return self.get_setting(key)
+
+    @property
+    def push_token(self):
+        # shared secret the push subscription passes in its endpoint URL
+        key = 'push_token'
+        if not self.exists(key):
+            self.set_setting(key, secrets.token_urlsafe(24))
+        return self.get_setting(key)
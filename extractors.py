@@ -0,0 +1,87 @@
+import re
+
+from meetings import MEETINGS
+from models import MeetingType as Type
+
+
+class Extractor:
+    """Finds a meeting's building and room in the text of an email
+
+    The pattern is compiled once. Before it runs, a plain `str.find` looks
+    for a literal word every match contains, and the pattern is only
+    searched in a bounded window around each hit. The work per hit is
+    capped by the window size, so the cost stays linear in the length of
+    the email however large or adversarial it is.
+    """
+    def __init__(self, literal: str, pattern: str, correct, before=40, after=400):
+        self.literal = literal
+        self.pattern = re.compile(pattern, re.X)
+        self.correct = correct
+        self.before = before
+        self.after = after
+
+    def extract(self, message: str) -> (str, str) or None:
+        hit = message.find(self.literal)
+        while hit != -1:
+            location = self.extract_at(message, hit)
+            if location:
+                return location
+            hit = message.find(self.literal, hit + len(self.literal))
+        return None
+
+    def extract_at(self, message: str, hit: int) -> (str, str) or None:
+        end = hit + self.after
+        match = self.pattern.search(message, max(0, hit - self.before), end)
+        if match is None or (match.end() >= end and end < len(message)):
+            # a match cut off by the window; the hit inside it sees all of it
+            return None
+        return self.correct(*match.groups())
+
+
+class Matcher:
+    """Finds every configured meeting in one scan of the email
+
+    The literals of all the extractors are joined into a single compiled
+    alternation, so the email is walked once however many meeting types
+    there are, and each hit only runs the windowed pattern of the meetings
+    sharing that literal. The scan stops as soon as every meeting is found.
+    """
+    def __init__(self, extractors: dict):
+        self.extractors = extractors
+        self.by_literal = {}
+        for meeting_type, extractor in extractors.items():
+            self.by_literal.setdefault(extractor.literal, []).append(meeting_type)
+        literals = sorted(self.by_literal, key=len, reverse=True)
+        # a lookahead finds overlapping hits too
+        self.literals = re.compile('(?=(%s))' % '|'.join(map(re.escape, literals)))
+
+    def match(self, message: str) -> dict:
+        found = dict.fromkeys(self.extractors)
+        missing = set(self.extractors)
+        for hit in self.literals.finditer(message):
+            for meeting_type in self.by_literal[hit.group(1)]:
+                if meeting_type in missing:
+                    found[meeting_type] = self.extractors[meeting_type].extract_at(message, hit.start())
+                    if found[meeting_type]:
+                        missing.discard(meeting_type)
+            if not missing:
+                break
+        return found
+
+
+def normalize(message: str) -> str:
+    # join lines of a quoted (forwarded) email
+    return re.sub(r'\r?\n>', '', message).lower()
+
+
+def extract_all(message: str) -> dict:
+    """Finds the location of every meeting type in one email, normalizing
+    and scanning the text only once. Types without a meeting map to None
+    """
+    return {meeting_type.value: location for meeting_type, location in MATCHER.match(normalize(message)).items()}
+
+
+EXTRACTORS = {Type(key): Extractor(meeting.literal, meeting.pattern, meeting.correct)
+              for key, meeting in MEETINGS.items()}
+
+MATCHER = Matcher(EXTRACTORS)
@@ -1,43 +1,173 @@
 import base64
 import os
+import random
+import socket
+import time
+from email.parser import BytesFeedParser
 from argparse import Namespace
-from logging import NOTSET
 
 from apiclient import discovery, errors
 from oauth2client import client, tools
-from oauth2client.file import Storage
 import httplib2
 
-from bs4 import BeautifulSoup
+from cache import DiscoveryCache, MessageCache
+from credentials import CredentialManager
+from metrics import Metrics
+from ratelimit import SharedRateLimiter
 
 
 class Gmail:
-    def __init__(self):
+    # base64 characters decoded and fed to the MIME parser at a time
+    CHUNK_SIZE = 64 * 1024
+
+    # quota units charged by Gmail for each method
+    QUOTA_UNITS = {
+        'messages.list': 5,
+        'messages.get': 5,
+        'history.list': 2,
+        'getProfile': 1,
+        'watch': 100
+    }
+    # Gmail allows 250 units per user per second; stay under it
+    QUOTA_RATE = 200
+    RETRIES = 5
+    MAX_BACKOFF = 32
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')
+    ACCOUNT = 'cm-bot'
+    # the words `subject:spiritual cyber-vitamin` matches in a subject
+    SUBJECT_WORDS = ('spiritual', 'cyber-vitamin')
+    # labels of added messages the search never returns
+    SKIPPED_LABELS = {'DRAFT', 'SPAM', 'TRASH'}
+    # reading a subject costs 5 units and the full list 6, so more added
+    # messages than this are cheaper to search for
+    MAX_ADDED = 1
+
+    def __init__(self, db=None, metrics=None, account=None):
+        self.db = db
+        self.metrics = metrics or Metrics()
+        self.account = account or self.ACCOUNT
         current_dir = os.path.dirname(__file__)
+        cache_dir = os.path.join(current_dir, '.cache')
+        message_dir = os.path.join(cache_dir, 'messages')
+        quota_path = os.path.join(cache_dir, 'quota.json')
+        if self.account != self.ACCOUNT:
+            # message ids and the per-user quota belong to one mailbox
+            message_dir = os.path.join(message_dir, self.account)
+            quota_path = os.path.join(cache_dir, f'quota-{self.account}.json')
         self.credential_dir = os.path.join(current_dir, '.credentials')
+        self.credential_path = os.path.join(self.credential_dir, f'{self.account}.json')
+        self.credential_manager = CredentialManager(self.credential_path)
+        self.discovery_cache = DiscoveryCache(cache_dir)
+        self.message_cache = MessageCache(message_dir)
+        self.quota = SharedRateLimiter(quota_path, self.QUOTA_RATE, self.QUOTA_RATE)
+        self.service = None
 
     def build_messages(self, service):
         """Uses the Gmail API to list messages matching the given query
         """
         user_id = 'me'
         query = 'subject:spiritual cyber-vitamin'
-        response = service.users().messages().list(userId=user_id, q=query).execute()
+        response = self.execute(service.users().messages().list(userId=user_id, q=query), 'messages.list')
         return response.get('messages', [])
 
+    def list_message_pages(self, service, page_token=None):
+        """Follows nextPageToken through every page of matching messages,
+        yielding each page's messages with the token of the page after it
+        """
+        user_id = 'me'
+        query = 'subject:spiritual cyber-vitamin'
+        while True:
+            request = service.users().messages().list(userId=user_id, q=query, pageToken=page_token)
+            response = self.execute(request, 'messages.list')
+            page_token = response.get('nextPageToken')
+            yield response.get('messages', []), page_token
+            if not page_token:
+                return
+
     def get_last_email_id(self, service, query=''):
+        if self.db is not None:
+            return self.sync_last_email_id(service)
         messages = self.build_messages(service)
         return messages[0]['id']
+
+    def sync_last_email_id(self, service):
+        """Asks Gmail only for the changes since the last stored historyId
+        and takes the newest added message with the weekly email's subject.
+        Falls back to a full list when there is no historyId, it has
+        expired or more messages were added than are cheaper to read
+        """
+        history_id = self.db.get_setting('history_id')
+        last_email_id = self.db.get_setting('last_email_id')
+        if history_id and last_email_id:
+            try:
+                added, history_id = self.list_history(service, history_id)
+            except errors.HttpError as error:
+                # Gmail answers 404 once the start historyId is too old
+                if error.resp.status != 404:
+                    raise
+                return self.full_sync(service)
+            if len(added) <= self.MAX_ADDED:
+                # newest first
+                email_id = next((msg_id for msg_id in reversed(added) if self.is_weekly_email(service, msg_id)),
+                                last_email_id)
+                self.db.set_setting('history_id', history_id)
+                self.db.set_setting('last_email_id', email_id)
+                return email_id
+        return self.full_sync(service)
+
+    def is_weekly_email(self, service, msg_id):
+        # only the subject is fetched, and not cached, since most new mail is something else
+        request = service.users().messages().get(userId='me', id=msg_id, format='metadata',
+                                                 metadataHeaders=['Subject'])
+        headers = self.execute(request, 'messages.get').get('payload', {}).get('headers', [])
+        subject = next((header['value'] for header in headers if header['name'].lower() == 'subject'), '')
+        return all(word in subject.lower() for word in self.SUBJECT_WORDS)
+
+    def full_sync(self, service):
+        # read the historyId before listing so nothing that arrives in between is missed
+        history_id = self.execute(service.users().getProfile(userId='me'), 'getProfile')['historyId']
+        email_id = self.build_messages(service)[0]['id']
+        self.db.set_setting('history_id', history_id)
+        self.db.set_setting('last_email_id', email_id)
+        return email_id
+
+    def watch(self, service, topic_name):
+        """Asks Gmail to publish to the Pub/Sub topic whenever the inbox
+        changes. The registration expires after seven days
+        """
+        body = {'topicName': topic_name, 'labelIds': ['INBOX'], 'labelFilterBehavior': 'include'}
+        return self.execute(service.users().watch(userId='me', body=body), 'watch')
+
+    def list_history(self, service, start_history_id):
+        """Returns the ids of the messages added since the given historyId,
+        oldest first, along with the mailbox's current historyId
+        """
+        user_id = 'me'
+        history = service.users().history()
+        request = history.list(userId=user_id, startHistoryId=start_history_id, historyTypes='messageAdded')
+        history_id = start_history_id
+        added = []
+        while request is not None:
+            response = self.execute(request, 'history.list')
+            history_id = response.get('historyId', history_id)
+            for record in response.get('history', []):
+                for added_message in record.get('messagesAdded', []):
+                    message = added_message['message']
+                    if not self.SKIPPED_LABELS & set(message.get('labelIds', [])) and message['id'] not in added:
+                        added.append(message['id'])
+            request = history.list_next(request, response)
+        return added, history_id
     
     def get_new_credentials(self):
         scopes = 'https://www.googleapis.com/auth/gmail.readonly'        
         self.make_credential_dir()
-        credential_path = os.path.join(self.credential_dir, 'cm-bot.json')        
         client_secret_path = os.path.join(self.credential_dir, 'client_secret.json')   
         flow = client.flow_from_clientsecrets(client_secret_path, scopes)
         flow.user_agent = 'CM Bot'
-        store = Storage(credential_path)
-        credentials = tools.run_flow(flow, store, self.get_flags())
-        print(f'Storing credentials to {credential_path}')
+        credentials = tools.run_flow(flow, self.credential_manager.storage, self.get_flags())
+        print(f'Storing credentials to {self.credential_path}')
+        self.credential_manager.use(credentials)
         return credentials
 
     def make_credential_dir(self):
@@ -45,50 +175,145 @@ class Gmail:
             os.makedirs(self.credential_dir)
 
     def get_credentials(self):
-        """Gets stored oauth2 credentials
+        """Gets stored oauth2 credentials, read from disk once and refreshed
+        ahead of expiry
         """
         self.make_credential_dir()
-        credential_path = os.path.join(self.credential_dir, 'cm-bot.json')
-
-        credentials = Storage(credential_path).get()
+        credentials = self.credential_manager.get()
         if not credentials or credentials.invalid:
             credentials = self.get_new_credentials()
         return credentials
 
-    def authorize(self):
-        # authorize with oauth2
-        credentials = self.get_credentials()
-        http = credentials.authorize(httplib2.Http())
-        return discovery.build('gmail', 'v1', http=http)
+    def authorize(self, refresh=False):
+        # authorize with oauth2 and reuse the built service for the rest of the process
+        if self.service is None or refresh:
+            self.service = self.build_service(refresh)
+        return self.service
+
+    def build_service(self, refresh=False):
+        """Builds a new service with its own connection, since httplib2
+        connections cannot be shared between threads
+        """
+        with self.metrics.span('credentials'):
+            credentials = self.get_credentials()
+            http = credentials.authorize(httplib2.Http())
+        with self.metrics.span('discovery'):
+            document = self.get_discovery_document(refresh)
+            service = discovery.build_from_document(document, http=http)
+        with self.metrics.span('token_refresh'):
+            # a token close to expiry was refreshing while the service was built
+            self.credential_manager.wait()
+        return service
+
+    def get_discovery_document(self, refresh=False):
+        """Loads the Gmail discovery document from the on-disk cache,
+        downloading it only when missing, expired or explicitly refreshed
+        """
+        document = None if refresh else self.discovery_cache.get('gmail', 'v1')
+        if document is None:
+            document = self.fetch_discovery_document()
+            self.discovery_cache.set('gmail', 'v1', document)
+        return document
+
+    def fetch_discovery_document(self):
+        uri = discovery.DISCOVERY_URI.format(api='gmail', apiVersion='v1')
+        response, content = httplib2.Http().request(uri)
+        if response.status >= 400:
+            raise Exception(f'Could not download the Gmail discovery document ({response.status})')
+        return content.decode('utf-8')
 
     def get_email_info(self, service, msg_id):
         """Uses the Gmail API to extract the encoded text from the message
         and decodes it to make it readable and searchable
         """
-        try:
-            message = self.get_message(service, msg_id)
-            headers = self.get_headers(service, msg_id)
-            return message, headers
-        except errors.HttpError as error:
-            print(f'An error occurred: {error}')
+        with self.metrics.span('fetch'):
+            raw = self.get_raw_message(service, msg_id)
+        with self.metrics.span('parse'):
+            message = self.parse_message(raw)
+            return self.extract_text(message), self.extract_headers(message)
+
+    def execute(self, request, method):
+        """Runs an API request within the quota shared by every process,
+        retrying rate limits, server errors and dropped connections with
+        jittered exponential backoff
+        """
+        for attempt in range(self.RETRIES + 1):
+            self.quota.wait(self.QUOTA_UNITS[method])
+            try:
+                return request.execute()
+            except errors.HttpError as error:
+                if not self.is_transient(error) or attempt == self.RETRIES:
+                    raise
+            except (socket.timeout, ConnectionError):
+                if attempt == self.RETRIES:
+                    raise
+            time.sleep(random.uniform(0, min(self.MAX_BACKOFF, 2 ** attempt)))
 
-    def decode_text(self, encoded_message):
-        message = str(base64.urlsafe_b64decode(encoded_message['raw']), 'utf-8')
-        return message.replace('=\r\n', '').replace('=22', '"').replace('=46', 'F').lower()
+    def is_transient(self, error):
+        # Gmail also reports exceeded rate limits as 403
+        content = error.content or b''
+        return error.resp.status in self.RETRY_STATUSES or \
+            (error.resp.status == 403 and any(reason in content for reason in self.RATE_LIMIT_REASONS))
+
+    def parse_message(self, encoded_message):
+        """Decodes the raw message chunk by chunk into the standard
+        library's incremental MIME parser
+        """
+        parser = BytesFeedParser()
+        raw = encoded_message['raw']
+        for start in range(0, len(raw), self.CHUNK_SIZE):
+            parser.feed(base64.urlsafe_b64decode(raw[start:start + self.CHUNK_SIZE]))
+        return parser.close()
+
+    def extract_text(self, message):
+        """Returns the lowercased plain text body, falling back to the
+        text of the HTML body; attachments are never decoded
+        """
+        body = self.find_part(message, 'text/plain') or self.find_part(message, 'text/html')
+        if body is None:
+            return ''
+        # undoes the quoted-printable or base64 transfer encoding
+        payload = body.get_payload(decode=True)
+        text = payload.decode(body.get_content_charset() or 'utf-8', errors='replace')
+        if body.get_content_type() == 'text/html':
+            from bs4 import BeautifulSoup
+            text = BeautifulSoup(text, 'html.parser').text
+        return text.lower()
 
-    def get_text(self, encoded_message: str):
-        text = self.decode_text(encoded_message)
-        return BeautifulSoup(text, 'html.parser').text
+    def find_part(self, message, content_type):
+        for part in message.walk():
+            if part.get_content_type() == content_type and part.get_content_disposition() != 'attachment':
+                return part
+        return None
+
+    def extract_headers(self, message):
+        """Lists the headers in the same shape the metadata format returns them
+        """
+        return [{'name': name, 'value': str(value)} for name, value in message.items()]
+
+    def get_text(self, encoded_message):
+        return self.extract_text(self.parse_message(encoded_message))
+
+    def get_raw_message(self, service, msg_id):
+        """Fetches the raw message once and serves every later request
+        for the same id from the local message cache
+        """
+        encoded_message = self.message_cache.get(msg_id)
+        if encoded_message is None:
+            user_id = 'me'
+            request = service.users().messages().get(userId=user_id, id=msg_id, format='raw')
+            encoded_message = self.execute(request, 'messages.get')
+            self.message_cache.set(msg_id, encoded_message)
+        return encoded_message
 
     def get_message(self, service, msg_id):
-        user_id = 'me'
-        encoded_message = service.users().messages().get(userId=user_id, id=msg_id, format='raw').execute()
-        return self.get_text(encoded_message)
+        return self.get_text(self.get_raw_message(service, msg_id))
 
     def get_headers(self, service, msg_id):
-        user_id = 'me'
-        response = service.users().messages().get(userId=user_id, id=msg_id, format='metadata').execute()
-        return response['payload']['headers']
+        return self.parse_headers(self.get_raw_message(service, msg_id))
+
+    def parse_headers(self, encoded_message):
+        return self.extract_headers(self.parse_message(encoded_message))
 
     def get_flags(self):
         kwargs = {
@@ -0,0 +1,60 @@
+from collections import Counter
+from datetime import date
+import json
+
+from sqlitedb import SQLiteDatabase
+
+
+class LocationHistory(SQLiteDatabase):
+    """Log of every meeting location found in an email
+
+    Records are kept in an SQLite table keyed (and so indexed) by meeting
+    type and meeting date, so a lookup reads only the rows it returns and
+    a process never loads the whole history. When the same meeting is
+    recorded twice the latest record wins.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS locations (
+        type TEXT NOT NULL,
+        date TEXT NOT NULL,
+        record TEXT NOT NULL,
+        PRIMARY KEY (type, date)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path='history.sqlite3'):
+        super().__init__(path)
+
+    def append(self, meeting_type: str, location: dict, replace=True) -> None:
+        """Records the location, replacing the meeting's earlier record
+        unless `replace` is off
+        """
+        with self.transaction():
+            self.put({'type': meeting_type, **location}, replace)
+
+    def put(self, record: dict, replace=True) -> None:
+        self.connection.execute(f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO locations (type, date, record) "
+                                'VALUES (?, ?, ?)', (record['type'], record['date'], json.dumps(record)))
+
+    def records(self) -> list:
+        rows = self.connection.execute('SELECT record FROM locations ORDER BY type, date').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def on(self, meeting_type: str, day: date) -> dict or None:
+        """Finds the location of the meeting held on the given date
+        """
+        row = self.connection.execute('SELECT record FROM locations WHERE type = ? AND date = ?',
+                                      (meeting_type, day.isoformat())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def between(self, meeting_type: str, start: date = None, end: date = None) -> list:
+        """Lists the meetings held from start to end, both inclusive
+        """
+        # ISO dates sort as strings, so the range is read from the primary key index
+        rows = self.connection.execute(
+            'SELECT record FROM locations WHERE type = ? AND date >= ? AND date <= ? ORDER BY date',
+            (meeting_type, start.isoformat() if start else '', end.isoformat() if end else '9999')).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def room_counts(self, meeting_type: str, start: date = None, end: date = None) -> Counter:
+        return Counter((record['building'], record['room']) for record in self.between(meeting_type, start, end))
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; writes are still atomic replacements there
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive inter-process lock held on a separate lock file
+
+    The lock is re-entrant and also serializes threads of the same
+    process, so nested write sections do not deadlock on themselves. The
+    time spent waiting is added up in `waited` for contention stats.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+        self.depth = 0
+        self.waited = 0.0
+        self.thread_lock = threading.RLock()
+
+    def acquire(self) -> None:
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl:
+                start = time.perf_counter()
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+                self.waited += time.perf_counter() - start
+        self.depth += 1
+
+    def try_acquire(self) -> bool:
+        """Takes the lock only if no other process holds it
+        """
+        if not self.thread_lock.acquire(blocking=False):
+            return False
+        if self.depth == 0:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl:
+                try:
+                    fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(self.fd)
+                    self.fd = None
+                    self.thread_lock.release()
+                    return False
+        self.depth += 1
+        return True
+
+    def release(self) -> None:
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def atomic_write(path: str, text: str, fsync=True) -> None:
+    """Replaces the file in one step so readers see either the old or
+    the new contents, never a partial write. Without `fsync` the write
+    may be lost on a crash, but is never torn
+    """
+    # a temp file of its own, so threads and processes writing the same path do not collide
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f'{os.path.basename(path)}.',
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
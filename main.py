@@ -1,58 +1,106 @@
-from datetime import datetime as dt, timedelta
+from datetime import datetime as dt, date, timedelta
+from functools import cached_property
 import argparse
+import os
+import subprocess
 import sys
 
 from database import Database
+from backfill import Backfill
 from cmbot import CMBot
-from models import MeetingType as Type
+from metrics import Metrics
+from outbox import OutboxDrainer
+from storage import migrate
+from meetings import MEETINGS
+from models import Location, MeetingType as Type
 
 
 class Main:
+    # a single run holds its database writes in memory until it finishes
+    write_behind = True
+
     def __init__(self, args: dict):
         self.args = args
-        self.bot = CMBot(self.specified_setup())
         self.meeting_type = self.get_meeting_type(args)
+        self.metrics = Metrics()
+
+    @cached_property
+    def bot(self) -> CMBot:
+        # built on first use, so --migrate runs before the database is opened
+        return CMBot(self.specified_setup(), write_behind=self.write_behind, metrics=self.metrics)
 
     def get_meeting_type(self, args: dict) -> Type:
-        return Type.CONVERSATIONS if self.args[Type.CONVERSATIONS.value] else Type.STUDENT_LEADER
+        # the first configured meeting when none is specified
+        return self.specified_meeting_type() or Type(next(iter(MEETINGS)))
 
-    def last_location(self) -> dict:
-        location = self.bot.last_location(self, meeting_type, sentence=True)
+    def last_location(self) -> str:
+        location = self.bot.last_location(self.meeting_type, sentence=True)
         return location if location else "Sorry, I couldn't find a previous location"
 
-    def build_conversations_message(self, location: str) -> str:
-        message = ''
-        if location['room'] == 'Classic Ballroom':
-            message = "Today's Conversations meeting will be held downstairs in the Walb Classic Ballroom."
-        elif location['room'] == '222-226':
-            message = "Today's Conversations meeting will be held upstairs in rooms 222-226."
-        message += self.pizza_night_message(location)
-        return message
-
-    def pizza_night_message(self, location: dict) -> str:
-        return ' Pizza tonight!' if self.bot.is_pizza_night(location['date']) else ''
-
-    def get_student_leader_meeting_location_message(self) -> str:
-        location = self.bot.find_location(Type.STUDENT_LEADER)
-        message = "Today's Student Leader meeting will be held in {building} {room}.".format_map(location)
-        return message
-
-    def get_conversations_meeting_location_message(self) -> str:
-        location = self.bot.find_location(Type.CONVERSATIONS)
-        message = self.build_conversations_message(location)
-        return message
+    def location_on(self, day: date) -> str:
+        location = self.bot.history.on(self.meeting_type.value, day)
+        return self.format_history(location) if location else f'No meeting location recorded for {day}'
+
+    def locations_between(self, start: date, end: date) -> str:
+        locations = self.bot.history.between(self.meeting_type.value, start, end)
+        return '\n'.join(map(self.format_history, locations)) or 'No meeting locations recorded in that range'
+
+    def room_stats(self) -> str:
+        counts = self.bot.history.room_counts(self.meeting_type.value)
+        lines = [f'{count:4}  {building} {room}' for (building, room), count in counts.most_common()]
+        return '\n'.join(lines) or 'No meeting locations recorded'
+
+    def format_history(self, location: dict) -> str:
+        return '{date}  {building} {room}'.format_map(location)
+
+    def build_message(self, meeting_type: Type, location: Location) -> str:
+        return MEETINGS[meeting_type.value].announce(location)
+
+    def announce(self, meeting_type: Type, parse: dict = None) -> Location or None:
+        """Queues today's location of the meeting unless it went out
+        already, raising while the email announcing it has not arrived.
+        A parse of the latest email read by someone else can be passed in
+        """
+        if self.bot.db.message_sent_today(meeting_type.value):
+            return None
+        if parse is None:
+            location = self.bot.locate(meeting_type)
+        else:
+            location = self.bot.find_meeting_location(meeting_type, parse)
+        self.meeting_type = meeting_type
+        self.post(self.build_message(meeting_type, location), location.date)
+        return location
+
+    def post(self, message: str, meeting_date: date) -> None:
+        """Queues the message about the meeting held on `meeting_date` for
+        every service that does not have it yet and leaves the delivery to
+        a background drainer
+        """
+        meeting_type = self.meeting_type.value
+        sent = self.bot.db.sent_services(meeting_type, meeting_date)
+        services = [service for service in self.bot.notifier.services if service.value not in sent]
+        with self.metrics.span('enqueue'):
+            self.bot.outbox.enqueue(meeting_type, meeting_date.isoformat(), message, services)
+        self.start_drainer()
+
+    def start_drainer(self) -> None:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), '--drain-outbox'], start_new_session=True,
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
     def specified_last_location(self) -> bool:
         return self.args['last_location']
     
-    def specified_clear_sent(self) -> bool:
-        return self.args['clear_sent']
+    def specified_on(self) -> date:
+        return self.args['on']
+
+    def specified_between(self) -> list:
+        return self.args['between']
 
-    def specified_conversations(self) -> bool:
-        return self.args[Type.CONVERSATIONS.value]
+    def specified_room_stats(self) -> bool:
+        return self.args['room_stats']
 
-    def specified_student_leader(self) -> bool:
-        return self.args[Type.STUDENT_LEADER.value]
+    def specified_meeting_type(self) -> Type or None:
+        return next((Type(key) for key in MEETINGS if self.args[key]), None)
 
     def specified_dry_run(self) -> bool:
         return self.args['dry_run']
@@ -60,51 +108,122 @@ class Main:
     def specified_setup(self) -> bool:
         return self.args['setup']
 
+    def specified_refresh_discovery(self) -> bool:
+        return self.args['refresh_discovery']
+
+    def specified_migrate(self) -> bool:
+        return self.args['migrate']
+
+    def specified_drain_outbox(self) -> bool:
+        return self.args['drain_outbox']
+
+    def specified_backfill(self) -> bool:
+        return self.args['backfill']
+
     def main(self) -> int:
+        with self.metrics.run(self.command()):
+            # the database holds every write of the run in memory until here
+            try:
+                return self.run()
+            finally:
+                if 'bot' in self.__dict__:
+                    with self.metrics.span('database'):
+                        self.bot.db.flush()
+
+    def command(self) -> str:
+        # the name a run's timings are logged under
+        for flag in ['drain_outbox', 'backfill', 'refresh_discovery']:
+            if self.args[flag]:
+                return flag
+        return self.meeting_type.value
+
+    def run(self) -> int:
         if self.specified_setup():
             self.bot.gmail.get_new_credentials()
             print("\nYou're all set up! Run `python main.py -h` for more help.")
             sys.exit()
 
+        if self.specified_migrate():
+            print(f'Migrated {migrate()} documents from db.json to db.sqlite3')
+            return
+
+        if self.specified_refresh_discovery():
+            self.bot.gmail.authorize(refresh=True)
+            print('Refreshed the cached Gmail discovery document')
+            return
+
+        if self.specified_drain_outbox():
+            print(f'Delivered {OutboxDrainer(self.bot).drain()} queued messages')
+            return
+
+        if self.specified_backfill():
+            Backfill(self.bot, self.args['workers']).run()
+            return
+
         if self.specified_last_location():
             print(self.last_location())
             return
 
-        if self.specified_clear_sent():
-            self.bot.db.clear_sent()
+        if self.specified_on():
+            print(self.location_on(self.specified_on()))
+            return
+
+        if self.specified_between():
+            print(self.locations_between(*self.specified_between()))
+            return
+
+        if self.specified_room_stats():
+            print(self.room_stats())
             return
 
         try:
-            if self.specified_conversations():
-                message = self.get_conversations_meeting_location_message()
-            elif self.specified_student_leader():
-                message = self.get_student_leader_meeting_location_message()
-            else:
-                raise Exception('Please specify either --student_leader or --conversations')
+            self.meeting_type = self.specified_meeting_type()
+            if self.meeting_type is None:
+                options = ', '.join(f"--{key.replace('_', '-')}" for key in MEETINGS)
+                raise Exception(f'Please specify one of {options}')
+            location = self.bot.find_location(self.meeting_type)
+            message = self.build_message(self.meeting_type, location)
 
             if self.specified_dry_run():
                 print(message)
             else:
-                self.bot.post(message)
-                self.bot.db.mark_as_sent(self.meeting_type)
+                self.post(message, location.date)
         except Exception as e:
             print(e)
             return 1
 
 
-def parse_args() -> argparse.ArgumentParser:
+def parse_args(argv: list = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
-    parser.add_argument('-s', '--student-leader', action='store_true', help='Get the location of the Student Leader meeting. Use with -l to show the last location.')
-    parser.add_argument('-c', '--conversations', action='store_true', help='Get the location of the Conversations meeting. Use with -l to show the last location.')
+    for key, meeting in MEETINGS.items():
+        flags = [meeting.flag] if meeting.flag else []
+        parser.add_argument(*flags, f"--{key.replace('_', '-')}", action='store_true', help=f'Get the location of the {meeting.name} meeting. Use with -l to show the last location.')
     parser.add_argument('-l', '--last-location', action='store_true', help='View the location of the last meeting. Used in conjunction with -s or -c.')
+    parser.add_argument('--on', type=date.fromisoformat, metavar='DATE', help='View the location of the meeting held on DATE (YYYY-MM-DD). Used in conjunction with -s or -c.')
+    parser.add_argument('--between', type=date.fromisoformat, nargs=2, metavar=('START', 'END'), help='View the locations of the meetings held from START to END. Used in conjunction with -s or -c.')
+    parser.add_argument('--room-stats', action='store_true', help='View how often each room has been used. Used in conjunction with -s or -c.')
     parser.add_argument('-n', '--dry-run', action='store_true', help='Do not send message to GroupMe--just show what would be sent.')
     parser.add_argument('--setup', action='store_true', help='Guided setup for CM-Bot.')        
-    parser.add_argument('--clear-sent', action='store_true', help='Clears the sent attribute in the database.')
-    args = parser.parse_args()
+    parser.add_argument('--daemon', action='store_true', help='Keep running and check for each meeting on its day, instead of using cron.')
+    parser.add_argument('--tenants', metavar='PATH', help='Keep running and serve every group in the tenant registry at PATH. Use with --setup to authorize each mailbox.')
+    parser.add_argument('--drain-outbox', action='store_true', help='Deliver every queued message, retrying until each one succeeds.')
+    parser.add_argument('--migrate', action='store_true', help='Move the database from db.json to db.sqlite3.')
+    parser.add_argument('--refresh-discovery', action='store_true', help='Re-download the cached Gmail discovery document.')
+    parser.add_argument('--backfill', action='store_true', help='Record the meeting locations from every past email into the location history.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent downloads used by --backfill.')
+    args = parser.parse_args(argv)
     return args
 
 
 if __name__ == '__main__':
     args = vars(parse_args())
-    code = Main(args).main()
+    if args['tenants']:
+        from tenants import TenantScheduler, load_registry
+        scheduler = TenantScheduler(load_registry(args['tenants']))
+        code = scheduler.setup() if args['setup'] else scheduler.serve()
+    elif args['daemon']:
+        from daemon import Daemon
+        code = Daemon(args).serve()
+    else:
+        code = Main(args).main()
     sys.exit(code or 0)
@@ -0,0 +1,137 @@
+from datetime import time as clock
+
+
+class Meeting:
+    """A recurring meeting the bot announces
+
+    `literal` is a word every announcement of the meeting contains, used to
+    find candidate spots in the email before `pattern` (a verbose regex
+    capturing the building and the room) is tried. Captured names are
+    looked up in `buildings` and `rooms` and capitalized when missing.
+    `check_at` is when the daemon starts looking for the meeting's email,
+    and `flag` the short command line option selecting the meeting.
+
+    The post announcing the meeting is `announcement` filled in with the
+    meeting's name, building and room, unless `room_announcements` words
+    the room differently. `first_week_note` is added in the first week of
+    the month.
+    """
+    ANNOUNCEMENT = "Today's {name} meeting will be held in {building} {room}."
+
+    def __init__(self, key: str, name: str, weekday: int, literal: str, pattern: str,
+                 buildings: dict = None, rooms: dict = None, check_at: clock = None, flag: str = None,
+                 announcement: str = ANNOUNCEMENT, room_announcements: dict = None, first_week_note: str = ''):
+        self.key = key
+        self.name = name
+        self.weekday = weekday
+        self.literal = literal
+        self.pattern = pattern
+        self.buildings = buildings or {}
+        self.rooms = rooms or {}
+        self.check_at = check_at
+        self.flag = flag
+        self.announcement = announcement
+        self.room_announcements = room_announcements or {}
+        self.first_week_note = first_week_note
+
+    def correct(self, building: str, room: str) -> (str, str):
+        return self.buildings.get(building, building.capitalize()), self.rooms.get(room, room.capitalize())
+
+    def announce(self, location) -> str:
+        template = self.room_announcements.get(location.room, self.announcement)
+        message = template.format(name=self.name, building=location.building, room=location.room)
+        if location.date.day <= 7:
+            message += self.first_week_note
+        return message
+
+
+MEETINGS = {meeting.key: meeting for meeting in [
+    Meeting(
+        key='student_leader',
+        name='Student Leader',
+        weekday=0,
+        literal='leader',
+        pattern=r"""
+            student
+            \s*
+            leader
+            s?                             # optional plural
+            \s*
+            meeting:
+            \s*
+            monday,                        # day of the week
+            \s*
+            \w+                            # month
+            \s*
+            \d\d?                          # day, optionally 1 digit
+            \w+                            # day ending ('st', 'th')
+            ,?                             # optional comma
+            \s*
+            (?:\w+|\d+)                    # starting time (noon or 12)
+            \s*
+            -
+            \s*
+            1(?::00)?                      # ending time (1 or 1:00)
+            \s*
+            p\.?m\.?,                      # 'pm' or 'p.m.'
+            \s*
+            (liberal\s*arts|l\.a\.|walb)   # building
+            \s*
+            \w*                            # extra info such as 'union' after 'walb'
+            \s*
+            \w*,
+            \s*
+            room
+            \s*
+            (
+            [g-]*                          # optional ground floor and hyphen ('G08', 'G-21')
+            \d{2}\d?                       # room number, max of 3 digits
+            )
+            """,
+        buildings={'liberal arts': 'LA', 'l.a.': 'LA'},
+        check_at=clock(9, 30),
+        flag='-s'),
+    Meeting(
+        key='conversations',
+        name='Conversations',
+        weekday=2,
+        literal='conversations',
+        pattern=r"""
+            cm
+            \s*
+            "conversations"
+            \s*
+            meeting:
+            \s*
+            wednesday         # day of the week
+            ,?
+            \s*
+            \w+               # month
+            \s*
+            \d\d?             # day, optionally 1 digit
+            \w+?              # optional day ending ('st', 'nd', 'th')
+            ,?
+            \s*
+            7(?::00)?         # starting time (7 or 7:30)
+            \s*
+            -
+            \s*
+            8:30              # ending time
+            \s*
+            p\.?m\.?,?        # 'pm' or 'p.m.'
+            \s*
+            (?:ipfw['’]s\s*)? # "IPFW's" Walb Classic Ballroom
+            (walb)            # building (always Walb)
+            ,?
+            .{0,200}?         # bounded, so a missing room cannot scan the rest of the email
+            (222|ballroom)""",
+        rooms={'ballroom': 'Classic Ballroom', '222': '222-226'},
+        check_at=clock(18, 15),
+        flag='-c',
+        room_announcements={
+            'Classic Ballroom': "Today's {name} meeting will be held downstairs in the Walb Classic Ballroom.",
+            '222-226': "Today's {name} meeting will be held upstairs in rooms 222-226."
+        },
+        # pizza night is the first Wednesday of the month
+        first_week_note=' Pizza tonight!'),
+]}
@@ -0,0 +1,160 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+from locking import FileLock
+
+
+class Metrics:
+    """Times the stages of a run and appends one JSON record per run to a
+    JSON Lines file
+
+    Spans are collected per thread, so a check and a background drainer in
+    the same process each log their own runs. Runs without any span, such
+    as history lookups, are not logged. Once the file reaches `max_bytes`
+    it is moved to `<path>.1`, replacing the previous one, and a new file
+    is started.
+    """
+    MAX_BYTES = 10 * 1024 * 1024
+
+    def __init__(self, path='metrics.jsonl', max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.lock = FileLock(f'{path}.lock')
+
+    @contextmanager
+    def run(self, command: str):
+        self.local.spans = []
+        started = datetime.now()
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            spans, self.local.spans = self.local.spans, None
+            if spans:
+                self.write({
+                    'command': command,
+                    'started': started.isoformat(timespec='seconds'),
+                    'seconds': round(time.perf_counter() - start, 6),
+                    'ok': ok,
+                    'spans': spans
+                })
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            spans = getattr(self.local, 'spans', None)
+            if spans is not None:
+                spans.append({'stage': stage, 'seconds': round(time.perf_counter() - start, 6), 'ok': ok})
+
+    def write(self, record: dict) -> None:
+        with self.lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f'{self.path}.1')
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+class Histogram:
+    # upper bounds in seconds, from a local cache hit to a slow OAuth refresh
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip([*map(str, self.BUCKETS), '+Inf'], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class MetricsReader:
+    """Turns the run records written by every process into Prometheus
+    histograms
+
+    Only the lines added since the last read are parsed, so a scrape costs
+    as much as the runs since the previous one. The counts are cumulative;
+    a rolling view comes from `rate()` over the scrape window. When the
+    file is rotated the rest of the old one is read before starting over
+    on the new one.
+    """
+    def __init__(self, path='metrics.jsonl'):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.stages = {}
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def update(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self.inode:
+            if self.inode is not None:
+                self.read(f'{self.path}.1', self.inode)
+            self.inode, self.offset = stat.st_ino, 0
+        elif stat.st_size < self.offset:
+            # truncated in place
+            self.offset = 0
+        self.read(self.path, self.inode)
+
+    def read(self, path: str, inode: int) -> None:
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_ino != inode:
+                # rotated again since it was last seen
+                return
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # still being written, read it on the next scrape
+                    break
+                self.offset += len(line)
+                self.add(json.loads(line))
+
+    def add(self, record: dict) -> None:
+        self.runs.setdefault(record['command'], Histogram()).observe(record['seconds'])
+        for span in record['spans']:
+            self.stages.setdefault(span['stage'], Histogram()).observe(span['seconds'])
+
+    def render(self) -> str:
+        with self.lock:
+            self.update()
+            lines = ['# HELP cmbot_run_seconds Duration of a whole run',
+                     '# TYPE cmbot_run_seconds histogram']
+            for command, histogram in sorted(self.runs.items()):
+                lines += histogram.lines('cmbot_run_seconds', f'command="{command}"')
+            lines += ['# HELP cmbot_stage_seconds Duration of each stage of a run',
+                      '# TYPE cmbot_stage_seconds histogram']
+            for stage, histogram in sorted(self.stages.items()):
+                lines += histogram.lines('cmbot_stage_seconds', f'stage="{stage}"')
+            return '\n'.join(lines) + '\n'
@@ -1,9 +1,38 @@
+from dataclasses import dataclass
+from datetime import date
 from enum import Enum
 
-class MeetingType(Enum):
-    STUDENT_LEADER = 'student_leader'
-    CONVERSATIONS = 'conversations'
+from meetings import MEETINGS
+
+# one member per configured meeting, e.g. MeetingType.STUDENT_LEADER = 'student_leader'
+MeetingType = Enum('MeetingType', [(key.upper(), key) for key in MEETINGS], module=__name__)
 
 class Service(Enum):
     GROUPME = 'GroupMe'
     SLACK = 'Slack'
+
+MONTHS = {abbr: number for number, abbr in enumerate(['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']) if abbr}
+
+@dataclass(frozen=True)
+class Location:
+    """Where and when a meeting is held. Building and room are None when
+    no meeting took place that day
+    """
+    __slots__ = ('date', 'building', 'room')
+    date: date
+    building: str
+    room: str
+
+    def to_dict(self) -> dict:
+        return {'building': self.building, 'room': self.room, 'date': self.date.isoformat()}
+
+    @classmethod
+    def from_dict(cls, record: dict):
+        day = record['date']
+        if isinstance(day, dict):
+            # stored before dates were kept as ISO strings
+            day = date(int(day['year']), MONTHS[day['month']], int(day['day']))
+        else:
+            day = date.fromisoformat(day)
+        return cls(day, record.get('building'), record.get('room'))
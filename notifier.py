@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from models import Service
+
+
+GROUPME_URL = 'https://api.groupme.com/v3/bots/post'
+
+
+class Notifier:
+    """Delivers a message to every configured service concurrently
+
+    Each service keeps its own keep-alive session, so repeated posts reuse
+    the TLS connection. Connection failures and 429/5xx answers are retried
+    with exponential backoff. Read timeouts are not retried, since the
+    message may already have been posted.
+    """
+    TIMEOUTS = {
+        # (connect, read) in seconds
+        Service.GROUPME: (3.05, 10),
+        Service.SLACK: (3.05, 10)
+    }
+
+    def __init__(self, bot_id: str, slack_url: str = None, retries=3, backoff=0.5, groupme_url=GROUPME_URL):
+        self.bot_id = bot_id
+        self.slack_url = slack_url
+        self.groupme_url = groupme_url
+        self.sessions = {service: self.make_session(retries, backoff) for service in Service}
+        self.pool = ThreadPoolExecutor(max_workers=len(Service))
+
+    def make_session(self, retries: int, backoff: float) -> requests.Session:
+        retry = Retry(total=retries, connect=retries, read=0, status=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset(['POST']))
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(max_retries=retry))
+        return session
+
+    @property
+    def services(self) -> list:
+        return [Service.GROUPME] + ([Service.SLACK] if self.slack_url else [])
+
+    def deliver(self, message: str, services: list = None) -> dict:
+        """Posts to the services at the same time and returns whether each
+        delivery succeeded
+        """
+        services = self.services if services is None else services
+        futures = {service: self.pool.submit(self.send, service, message) for service in services}
+        return {service: future.result() for service, future in futures.items()}
+
+    def send(self, service: Service, message: str) -> bool:
+        try:
+            response = self.sessions[service].post(self.get_url(service), data=self.get_payload(service, message),
+                                                   timeout=self.TIMEOUTS[service])
+            response.raise_for_status()
+            return True
+        except requests.RequestException as e:
+            print(f'Could not post to {service.value}: {e}')
+            return False
+
+    def get_url(self, service: Service) -> str:
+        return self.groupme_url if service == Service.GROUPME else self.slack_url
+
+    def get_payload(self, service: Service, message: str) -> dict:
+        if service == Service.GROUPME:
+            payload = {'bot_id': self.bot_id, 'text': message}
+        elif service == Service.SLACK:
+            payload = {'payload': json.dumps({'text': message})}
+        return payload
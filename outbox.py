@@ -0,0 +1,167 @@
+from datetime import date
+import random
+import time
+
+from locking import FileLock
+from models import Service
+from ratelimit import RateLimiter
+from sqlitedb import SQLiteDatabase
+
+
+class Outbox(SQLiteDatabase):
+    """Durable queue of outgoing messages, one entry per destination service
+
+    An entry is keyed by meeting type, meeting date and service, so queuing
+    the same meeting twice is a no-op. Entries stay pending until a
+    drainer delivers them.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY,
+        meeting_type TEXT NOT NULL,
+        meeting_date TEXT NOT NULL,
+        service TEXT NOT NULL,
+        message TEXT NOT NULL,
+        delivered INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        UNIQUE (meeting_type, meeting_date, service)
+    );
+    CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (delivered, next_attempt);
+    """
+    MAX_BACKOFF = 15 * 60
+
+    def __init__(self, path='outbox.sqlite3'):
+        super().__init__(path)
+
+    def enqueue(self, meeting_type: str, meeting_date: str, message: str, services: list) -> int:
+        """Queues the message for every service in one transaction and
+        returns how many entries were new
+        """
+        with self.transaction():
+            before = self.connection.total_changes
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO outbox (meeting_type, meeting_date, service, message, next_attempt) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(meeting_type, meeting_date, service.value, message, time.time()) for service in services])
+            return self.connection.total_changes - before
+
+    KEYS = ['id', 'meeting_type', 'meeting_date', 'service', 'message', 'attempts']
+
+    def next_due(self) -> dict or None:
+        row = self.connection.execute(
+            'SELECT id, meeting_type, meeting_date, service, message, attempts FROM outbox '
+            'WHERE delivered = 0 AND next_attempt <= ? ORDER BY next_attempt LIMIT 1', (time.time(),)).fetchone()
+        return dict(zip(self.KEYS, row)) if row else None
+
+    def due_for(self, meeting_type: str, meeting_date: str) -> list:
+        """Lists the entries of one meeting that are due, one per service
+        """
+        rows = self.connection.execute(
+            'SELECT id, meeting_type, meeting_date, service, message, attempts FROM outbox '
+            'WHERE delivered = 0 AND next_attempt <= ? AND meeting_type = ? AND meeting_date = ? ORDER BY id',
+            (time.time(), meeting_type, meeting_date)).fetchall()
+        return [dict(zip(self.KEYS, row)) for row in rows]
+
+    def seconds_until_next(self) -> float or None:
+        row = self.connection.execute('SELECT MIN(next_attempt) FROM outbox WHERE delivered = 0').fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def pending(self, meeting_type: str = None, meeting_date: str = None) -> int:
+        query = 'SELECT COUNT(*) FROM outbox WHERE delivered = 0'
+        params = ()
+        if meeting_type is not None:
+            query += ' AND meeting_type = ? AND meeting_date = ?'
+            params = (meeting_type, meeting_date)
+        return self.connection.execute(query, params).fetchone()[0]
+
+    def mark_delivered(self, entry_id: int) -> None:
+        with self.transaction():
+            self.connection.execute('UPDATE outbox SET delivered = 1, attempts = attempts + 1 WHERE id = ?',
+                                    (entry_id,))
+
+    def mark_failed(self, entry_id: int, attempts: int) -> None:
+        # exponential backoff with full jitter, capped so delivery keeps being retried
+        delay = random.uniform(0, min(self.MAX_BACKOFF, 2 ** attempts))
+        with self.transaction():
+            self.connection.execute('UPDATE outbox SET attempts = attempts + 1, next_attempt = ? WHERE id = ?',
+                                    (time.time() + delay, entry_id))
+
+
+class OutboxDrainer:
+    """Delivers pending outbox entries until none are left, respecting a
+    per-service rate limit, and records every delivery in the send ledger
+
+    The due entries of one meeting are posted to their services at the
+    same time.
+
+    Only one drainer runs at a time; a second one exits right away since
+    the running drainer also picks up entries queued after it started.
+    """
+    RATES = {
+        # messages per second, burst
+        Service.GROUPME: (1, 3),
+        Service.SLACK: (1, 1)
+    }
+
+    def __init__(self, bot, poll=1.0, timeout=None):
+        self.bot = bot
+        self.poll = poll
+        self.timeout = timeout
+        self.limiters = {service: RateLimiter(*rate) for service, rate in self.RATES.items()}
+        self.lock = FileLock(f'{bot.outbox.path}.lock')
+
+    def drain(self) -> int:
+        delivered = 0
+        while self.lock.try_acquire():
+            try:
+                delivered += self.deliver_pending()
+            finally:
+                self.lock.release()
+            # look again after letting go of the lock, in case an entry was
+            # queued while this drainer was on its way out
+            if self.timeout is not None or not self.bot.outbox.pending():
+                break
+        return delivered
+
+    def deliver_pending(self) -> int:
+        outbox = self.bot.outbox
+        delivered = 0
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            entry = outbox.next_due()
+            if entry is None:
+                wait = outbox.seconds_until_next()
+                if wait is None or (deadline is not None and time.monotonic() >= deadline):
+                    return delivered
+                time.sleep(min(wait, self.poll))
+                continue
+            delivered += self.deliver_meeting(outbox.due_for(entry['meeting_type'], entry['meeting_date']))
+
+    def deliver_meeting(self, entries: list) -> int:
+        outbox = self.bot.outbox
+        sent = self.bot.db.sent_services(entries[0]['meeting_type'], date.fromisoformat(entries[0]['meeting_date']))
+        messages = {}
+        for entry in entries:
+            if entry['service'] in sent:
+                # another run already delivered it
+                outbox.mark_delivered(entry['id'])
+                continue
+            self.limiters[Service(entry['service'])].wait()
+            # the entries of a meeting are queued with one message
+            messages.setdefault(entry['message'], []).append(entry)
+        delivered = 0
+        for message, entries in messages.items():
+            results = self.bot.post(message, [Service(entry['service']) for entry in entries])
+            for entry in entries:
+                if results[Service(entry['service'])]:
+                    outbox.mark_delivered(entry['id'])
+                    self.record(entry)
+                    delivered += 1
+                else:
+                    outbox.mark_failed(entry['id'], entry['attempts'])
+        return delivered
+
+    def record(self, entry: dict) -> None:
+        with self.bot.metrics.span('database'):
+            self.bot.db.record_send(entry['meeting_type'], entry['meeting_date'], entry['service'])
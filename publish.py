@@ -0,0 +1,46 @@
+"""Stands in for Pub/Sub by pushing a Gmail watch notification to the
+local server, so push mode can be exercised without a Google project
+
+    $ python publish.py --history-id 123456
+"""
+import argparse
+import base64
+from datetime import datetime, timezone
+import json
+import uuid
+
+import requests
+
+from database import Database
+
+
+def envelope(email_address: str, history_id: int) -> dict:
+    data = json.dumps({'emailAddress': email_address, 'historyId': history_id}).encode('utf-8')
+    return {
+        'message': {
+            'data': base64.b64encode(data).decode('ascii'),
+            'messageId': uuid.uuid4().hex,
+            'publishTime': datetime.now(timezone.utc).isoformat()
+        },
+        'subscription': 'projects/local/subscriptions/cm-bot'
+    }
+
+
+def publish(url: str, token: str, email_address: str, history_id: int) -> int:
+    response = requests.post(url, params={'token': token}, json=envelope(email_address, history_id), timeout=10)
+    return response.status_code
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5001/gmail', help='Notification endpoint of server.py.')
+    parser.add_argument('--email', default='me@example.com', help='Mailbox the notification is about.')
+    parser.add_argument('--history-id', type=int, default=1, help='historyId carried by the notification.')
+    parser.add_argument('--token', help='Push token; read from the database when omitted.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    token = args.token or Database().push_token
+    print(publish(args.url, token, args.email, args.history_id))
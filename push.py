@@ -0,0 +1,110 @@
+import base64
+from datetime import date
+import json
+import threading
+import time
+
+from meetings import MEETINGS
+from models import MeetingType as Type
+
+
+class PushListener:
+    """Reacts to Gmail watch notifications delivered by a Pub/Sub push
+    subscription
+
+    Notifications are acknowledged right away and handled by a worker
+    thread. Each one runs an incremental history sync, so a burst of them
+    collapses into a single fetch, and one whose change an earlier sync
+    already read is skipped. The new email is parsed as soon as it
+    arrives, and a meeting held today is announced at once. Meetings on
+    later days are answered from the stored parse with no Gmail request
+    when their scheduled run comes. The watch expires after seven days,
+    so it is renewed daily.
+    """
+    RENEW_EVERY = 24 * 60 * 60
+
+    def __init__(self, main, topic: str, renew_every=RENEW_EVERY):
+        self.main = main
+        self.topic = topic
+        self.renew_every = renew_every
+        self.pending = threading.Event()
+        self.stopped = threading.Event()
+        self.history_id = None
+
+    def start(self) -> None:
+        threading.Thread(target=self.run, name='gmail-push', daemon=True).start()
+        threading.Thread(target=self.renew_forever, name='gmail-watch', daemon=True).start()
+
+    def notify(self, envelope: dict) -> bool:
+        """Accepts a Pub/Sub push envelope, returning False when it does
+        not carry a Gmail notification
+        """
+        try:
+            data = json.loads(base64.b64decode(envelope['message']['data']))
+            self.history_id = int(data['historyId'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        self.pending.set()
+        return True
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            self.pending.wait()
+            self.pending.clear()
+            if not self.synced():
+                self.handle()
+
+    def synced(self) -> bool:
+        """Whether the last history sync already read the change in the
+        latest notification, so there is nothing new to fetch
+        """
+        history_id = self.main.bot.db.get_setting('history_id')
+        return history_id is not None and self.history_id is not None and int(history_id) >= self.history_id
+
+    def handle(self, today: date = None) -> list:
+        """Parses the latest email and announces every meeting held today,
+        returning the meeting types that were queued
+        """
+        today = today or date.today()
+        with self.main.metrics.run('push'):
+            try:
+                self.main.bot.parse_latest_email()
+            except Exception as e:
+                print(f'Could not fetch the latest email: {e}')
+                return []
+            announced = []
+            for key, meeting in MEETINGS.items():
+                if meeting.weekday != today.weekday():
+                    continue
+                try:
+                    if self.main.announce(Type(key)):
+                        announced.append(Type(key))
+                except Exception as e:
+                    # the new email is not the one announcing today's meeting
+                    print(f'{key}: {e}')
+            return announced
+
+    def renew_forever(self) -> None:
+        while not self.stopped.is_set():
+            self.renew()
+            self.stopped.wait(self.renew_every)
+
+    def renew(self) -> dict or None:
+        try:
+            # its own connection, since the push thread is using the shared service
+            service = self.main.bot.gmail.build_service()
+            watch = self.main.bot.gmail.watch(service, self.topic)
+        except Exception as e:
+            print(f'Could not renew the Gmail watch: {e}')
+            return None
+        self.main.bot.db.set_setting('watch', {
+            'topic': self.topic,
+            'history_id': watch['historyId'],
+            'expires': int(watch['expiration']) / 1000,
+            'renewed': time.time()
+        })
+        return watch
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.pending.set()
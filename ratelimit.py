@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+import time
+
+from locking import FileLock, atomic_write
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second with bursts of up to
+    `burst` calls
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, cost: float = 1) -> float:
+        """Blocks until a call is allowed and returns how long it waited
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            delay = 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+            self.tokens -= cost
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class SharedRateLimiter:
+    """Token bucket whose state lives in a file, so every process on the
+    machine draws from the same budget
+
+    Each call reserves its tokens under a file lock and sleeps outside of
+    it, so one waiting process does not hold up the others' bookkeeping.
+    """
+    def __init__(self, path: str, rate: float, burst: float):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.lock = FileLock(f'{path}.lock')
+
+    def wait(self, cost: float = 1) -> float:
+        """Blocks until a call costing `cost` tokens is allowed and returns
+        how long it waited
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self.lock:
+            now = time.time()
+            tokens, updated = self.read(now)
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            delay = 0.0 if tokens >= cost else (cost - tokens) / self.rate
+            # losing the count in a crash only resets the bucket, so it is not synced to disk
+            atomic_write(self.path, json.dumps({'tokens': tokens - cost, 'updated': now}), fsync=False)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def read(self, now: float) -> (float, float):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            return state['tokens'], state['updated']
+        except (FileNotFoundError, ValueError, KeyError):
+            return self.burst, now
@@ -0,0 +1,79 @@
+import queue
+import threading
+import time
+
+
+class SlackRelay:
+    """Posts messages to Slack from a background thread
+
+    Messages that arrive within `window` seconds of the first one waiting
+    are joined into a single post, so a burst of group chat traffic costs
+    one Slack round trip instead of one per message.
+    """
+    def __init__(self, send, window=2.0, max_batch=50):
+        self.send = send
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='slack-relay', daemon=True)
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.failed = 0
+        self.batches = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def enqueue(self, message: str) -> None:
+        self.queue.put((time.monotonic(), message))
+
+    def run(self) -> None:
+        while True:
+            batch = self.next_batch()
+            ok = False
+            try:
+                ok = self.send('\n'.join(message for _, message in batch))
+            except Exception as e:
+                # a failed post must not stop the relay for every later message
+                print(f'Could not relay {len(batch)} messages to Slack: {e}')
+            finally:
+                self.record(batch, ok)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def next_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = batch[0][0] + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def record(self, batch: list, ok: bool) -> None:
+        latency = time.monotonic() - batch[0][0]
+        with self.lock:
+            self.batches += 1
+            if ok:
+                self.delivered += len(batch)
+            else:
+                self.failed += len(batch)
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'batches': self.batches,
+                'latency_avg': self.latency_total / self.batches if self.batches else 0.0,
+                'latency_max': self.latency_max
+            }
@@ -0,0 +1,82 @@
+from datetime import datetime, time as clock, timedelta
+import threading
+
+from meetings import MEETINGS
+
+
+class Scheduler:
+    """The check loop shared by the daemon and the tenant scheduler
+
+    From its scheduled time on the day of its meeting each check is
+    retried with exponential backoff until it succeeds. Queued messages
+    are delivered by a drainer thread, woken after every round of checks.
+
+    Subclasses list what to check in `schedule`, run the due checks in
+    `check`, reporting each with `succeeded` or `retry`, and deliver the
+    queued messages in `drain`.
+    """
+    def __init__(self, poll=30, max_poll=5 * 60):
+        self.poll = poll
+        self.max_poll = max_poll
+        self.stopped = threading.Event()
+        self.outbox_ready = threading.Event()
+        self.today = None
+        self.next_attempt = {}
+        self.delay = {}
+
+    def schedule(self) -> dict:
+        """Maps the key of every check to its meeting type and the time to
+        start checking
+        """
+        raise NotImplementedError
+
+    def check(self, due: list, now: datetime) -> None:
+        raise NotImplementedError
+
+    def drain(self) -> None:
+        raise NotImplementedError
+
+    def serve(self) -> int:
+        threading.Thread(target=self.drain_forever, name='outbox-drainer', daemon=True).start()
+        while not self.stopped.is_set():
+            now = datetime.now()
+            if now.date() != self.today:
+                self.start_day(now)
+            due = [key for key, attempt_at in self.next_attempt.items() if now >= attempt_at]
+            if due:
+                self.check(due, now)
+            self.stopped.wait(self.seconds_until_next(now))
+        return 0
+
+    def start_day(self, now: datetime) -> None:
+        self.today = now.date()
+        self.next_attempt = {
+            key: datetime.combine(self.today, check_at)
+            for key, (meeting_type, check_at) in self.schedule().items()
+            if MEETINGS[meeting_type.value].weekday == self.today.weekday()
+        }
+        self.delay = dict.fromkeys(self.next_attempt, self.poll)
+
+    def succeeded(self, key) -> None:
+        del self.next_attempt[key]
+
+    def retry(self, key, now: datetime, label: str, error: Exception) -> None:
+        # this week's email has not arrived yet
+        print(f'{now:%H:%M:%S} {label}: {error}, retrying in {self.delay[key]}s')
+        self.next_attempt[key] = now + timedelta(seconds=self.delay[key])
+        self.delay[key] = min(self.max_poll, self.delay[key] * 2)
+
+    def seconds_until_next(self, now: datetime) -> float:
+        midnight = datetime.combine(now.date() + timedelta(days=1), clock())
+        wake = min([midnight, *self.next_attempt.values()])
+        return max(1.0, min(60.0, (wake - now).total_seconds()))
+
+    def drain_forever(self) -> None:
+        while not self.stopped.is_set():
+            self.drain()
+            self.outbox_ready.wait(timeout=30)
+            self.outbox_ready.clear()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.outbox_ready.set()
@@ -1,11 +1,27 @@
 from datetime import datetime as dt
 import json
+import secrets
+import threading
 
-from flask import Flask, request
-from cmbot import CMBot
+from flask import Flask, Response, request, jsonify
+from daemon import Daemon
+from main import parse_args
+from metrics import MetricsReader
+from push import PushListener
+from relay import SlackRelay
 
 app = Flask(__name__)
-bot = CMBot()
+# a long-lived Main: unbuffered database writes, and queued messages are
+# delivered by a drainer thread
+main = Daemon(vars(parse_args([])))
+bot = main.bot
+relay = SlackRelay(bot.post_to_slack)
+relay.start()
+metrics = MetricsReader(bot.metrics.path)
+threading.Thread(target=main.drain_forever, name='outbox-drainer', daemon=True).start()
+push = PushListener(main, bot.db.push_topic) if bot.db.push_topic else None
+if push:
+    push.start()
 
 
 @app.route('/', methods=['POST'])
@@ -16,9 +32,33 @@ def parse():
     return 'OK', 200
 
 
+@app.route('/gmail', methods=['POST'])
+def gmail_notification():
+    # the push subscription's endpoint is /gmail?token=<push_token>
+    if push is None:
+        return 'Push notifications are not configured', 404
+    if not secrets.compare_digest(request.args.get('token', ''), bot.db.push_token):
+        return 'Forbidden', 403
+    if not push.notify(request.get_json(silent=True) or {}):
+        # acknowledged anyway, since Pub/Sub would redeliver it forever
+        print(f'Ignored a malformed push notification: {request.get_data(as_text=True)[:200]}')
+    return '', 204
+
+
+@app.route('/relay', methods=['GET'])
+def relay_stats():
+    return jsonify(relay.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # stage timings of every run on this machine, in the Prometheus text format
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 def log(data: str) -> None:
     message = '{name} - {text}'.format_map(data)
-    bot.post_to_slack(message)
+    relay.enqueue(message)
     
 
 if __name__ == '__main__':
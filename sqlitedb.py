@@ -0,0 +1,39 @@
+from contextlib import contextmanager
+import sqlite3
+import threading
+
+
+class SQLiteDatabase:
+    """SQLite database file shared by every thread of a process
+
+    The database runs in WAL mode, so readers never block on a writer, and
+    every write takes the write lock up front with BEGIN IMMEDIATE.
+    Subclasses create their tables in SCHEMA.
+    """
+    SCHEMA = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(self.SCHEMA)
+        self.thread_lock = threading.RLock()
+        self.in_transaction = False
+
+    @contextmanager
+    def transaction(self):
+        with self.thread_lock:
+            # nested transactions join the outermost one
+            if self.in_transaction:
+                yield
+                return
+            self.in_transaction = True
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            finally:
+                self.in_transaction = False
@@ -0,0 +1,293 @@
+from contextlib import contextmanager
+import json
+import os
+
+from tinydb import TinyDB, Query
+from tinydb.storages import Storage as TinyDBBaseStorage
+
+from locking import FileLock, atomic_write
+from sqlitedb import SQLiteDatabase
+
+
+class Storage:
+    """Interface the Database persists meetings, settings and sends through
+
+    A meeting is a dict of fields stored under its meeting type, and a
+    setting is a single JSON value stored under its key. The send ledger
+    holds one entry per meeting type, meeting date and service a message
+    reached.
+    """
+    def get_meeting(self, meeting_type: str) -> dict or None:
+        raise NotImplementedError
+
+    def save_meeting(self, meeting_type: str, fields: dict) -> None:
+        """Merges the fields into the meeting, creating it if needed
+        """
+        raise NotImplementedError
+
+    def has_setting(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def get_setting(self, key: str):
+        raise NotImplementedError
+
+    def set_setting(self, key: str, value) -> None:
+        raise NotImplementedError
+
+    def record_send(self, meeting_type: str, meeting_date: str, service: str) -> bool:
+        """Adds the send to the ledger, returning False when it was already there
+        """
+        raise NotImplementedError
+
+    def sent_services(self, meeting_type: str, meeting_date: str) -> list:
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        """Serializes a read-modify-write against every other writer,
+        including writers in other processes
+        """
+        yield
+
+    def flush(self) -> None:
+        pass
+
+
+class AtomicJSONStorage(TinyDBBaseStorage):
+    """TinyDB storage that replaces db.json atomically on every write, so
+    readers never need a lock and never see a half-written file
+    """
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        return json.loads(text) if text.strip() else None
+
+    def write(self, data):
+        atomic_write(self.path, json.dumps(data))
+
+    def close(self):
+        pass
+
+
+class TinyDBStorage(Storage):
+    """The original db.json layout: one document per meeting type and one
+    document per setting
+
+    Writers hold an exclusive lock on db.json.lock for their whole
+    read-modify-write, while readers read the atomically replaced file
+    without locking.
+    """
+    def __init__(self, path='db.json'):
+        self.path = path
+        self.q = Query()
+        self.lock = FileLock(f'{path}.lock')
+        self.open()
+
+    def open(self) -> None:
+        self.db = TinyDB(self.path, storage=AtomicJSONStorage)
+        self.sends = self.db.table('sends')
+
+    def get_meeting(self, meeting_type: str) -> dict or None:
+        return self.db.get(self.q.type == meeting_type)
+
+    def save_meeting(self, meeting_type: str, fields: dict) -> None:
+        with self.transaction():
+            if self.db.contains(self.q.type == meeting_type):
+                self.db.update(fields, self.q.type == meeting_type)
+            else:
+                self.db.insert({'type': meeting_type, **fields})
+
+    def has_setting(self, key: str) -> bool:
+        return self.db.contains(self.q[key].exists())
+
+    def get_setting(self, key: str):
+        return (self.db.get(self.q[key].exists()) or {}).get(key, None)
+
+    def set_setting(self, key: str, value) -> None:
+        with self.transaction():
+            if self.has_setting(key):
+                self.db.update({key: value}, self.q[key].exists())
+            else:
+                self.db.insert({key: value})
+
+    def record_send(self, meeting_type: str, meeting_date: str, service: str) -> bool:
+        send = {'type': meeting_type, 'date': meeting_date, 'service': service}
+        with self.transaction():
+            if self.sends.contains(self.send_query(send)):
+                return False
+            self.sends.insert(send)
+            return True
+
+    def sent_services(self, meeting_type: str, meeting_date: str) -> list:
+        # search results are cached per table and miss other processes' sends
+        self.sends.clear_cache()
+        sends = self.sends.search((self.q.type == meeting_type) & (self.q.date == meeting_date))
+        return sorted(send['service'] for send in sends)
+
+    def send_query(self, send: dict):
+        return (self.q.type == send['type']) & (self.q.date == send['date']) & (self.q.service == send['service'])
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            # TinyDB caches the next document id per table, which another
+            # process may have used since; reopening reads it from the file
+            self.open()
+            yield
+
+    def documents(self) -> list:
+        return self.db.all()
+
+    def send_documents(self) -> list:
+        return self.sends.all()
+
+
+class SQLiteStorage(SQLiteDatabase, Storage):
+    """Keeps meetings and settings in SQLite tables keyed (and so indexed)
+    by meeting type and setting key, so each call touches a single row
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meetings (type TEXT PRIMARY KEY, fields TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS sends (
+        meeting_type TEXT NOT NULL,
+        meeting_date TEXT NOT NULL,
+        service TEXT NOT NULL,
+        PRIMARY KEY (meeting_type, meeting_date, service)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path='db.sqlite3'):
+        super().__init__(path)
+
+    def get_meeting(self, meeting_type: str) -> dict or None:
+        row = self.connection.execute('SELECT fields FROM meetings WHERE type = ?', (meeting_type,)).fetchone()
+        return {'type': meeting_type, **json.loads(row[0])} if row else None
+
+    def save_meeting(self, meeting_type: str, fields: dict) -> None:
+        with self.transaction():
+            meeting = self.get_meeting(meeting_type) or {}
+            meeting.pop('type', None)
+            self.put_meeting(meeting_type, {**meeting, **fields})
+
+    def put_meeting(self, meeting_type: str, fields: dict) -> None:
+        self.connection.execute('INSERT OR REPLACE INTO meetings (type, fields) VALUES (?, ?)',
+                                (meeting_type, json.dumps(fields)))
+
+    def has_setting(self, key: str) -> bool:
+        return self.connection.execute('SELECT 1 FROM settings WHERE key = ?', (key,)).fetchone() is not None
+
+    def get_setting(self, key: str):
+        row = self.connection.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_setting(self, key: str, value) -> None:
+        with self.transaction():
+            self.connection.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                                    (key, json.dumps(value)))
+
+    def record_send(self, meeting_type: str, meeting_date: str, service: str) -> bool:
+        with self.transaction():
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO sends (meeting_type, meeting_date, service) VALUES (?, ?, ?)',
+                (meeting_type, meeting_date, service))
+            return cursor.rowcount == 1
+
+    def sent_services(self, meeting_type: str, meeting_date: str) -> list:
+        # served from the primary key index
+        rows = self.connection.execute(
+            'SELECT service FROM sends WHERE meeting_type = ? AND meeting_date = ? ORDER BY service',
+            (meeting_type, meeting_date)).fetchall()
+        return [row[0] for row in rows]
+
+
+class WriteBehindStorage(Storage):
+    """Serves reads through an in-memory copy and holds every write until
+    flush, which applies them to the backend in a single transaction
+    """
+    def __init__(self, backend: Storage):
+        self.backend = backend
+        self.meetings = {}
+        self.settings = {}
+        self.dirty_meetings = set()
+        self.dirty_settings = set()
+
+    def get_meeting(self, meeting_type: str) -> dict or None:
+        if meeting_type not in self.meetings:
+            self.meetings[meeting_type] = self.backend.get_meeting(meeting_type)
+        meeting = self.meetings[meeting_type]
+        return dict(meeting) if meeting is not None else None
+
+    def save_meeting(self, meeting_type: str, fields: dict) -> None:
+        meeting = self.get_meeting(meeting_type) or {'type': meeting_type}
+        self.meetings[meeting_type] = {**meeting, **fields}
+        self.dirty_meetings.add(meeting_type)
+
+    def has_setting(self, key: str) -> bool:
+        return key in self.settings or self.backend.has_setting(key)
+
+    def get_setting(self, key: str):
+        if key not in self.settings and self.backend.has_setting(key):
+            self.settings[key] = self.backend.get_setting(key)
+        return self.settings.get(key)
+
+    def set_setting(self, key: str, value) -> None:
+        self.settings[key] = value
+        self.dirty_settings.add(key)
+
+    def record_send(self, meeting_type: str, meeting_date: str, service: str) -> bool:
+        # not held back: other processes rely on the ledger to skip a send
+        return self.backend.record_send(meeting_type, meeting_date, service)
+
+    def sent_services(self, meeting_type: str, meeting_date: str) -> list:
+        return self.backend.sent_services(meeting_type, meeting_date)
+
+    def flush(self) -> None:
+        with self.backend.transaction():
+            for meeting_type in self.dirty_meetings:
+                fields = dict(self.meetings[meeting_type])
+                fields.pop('type', None)
+                self.backend.save_meeting(meeting_type, fields)
+            for key in self.dirty_settings:
+                self.backend.set_setting(key, self.settings[key])
+        self.backend.flush()
+        self.dirty_meetings.clear()
+        self.dirty_settings.clear()
+
+
+def open_storage(json_path='db.json', sqlite_path='db.sqlite3') -> Storage:
+    """Keeps using an existing db.json until it has been migrated, and
+    uses SQLite otherwise
+    """
+    if os.path.exists(json_path) and not os.path.exists(sqlite_path):
+        return TinyDBStorage(json_path)
+    return SQLiteStorage(sqlite_path)
+
+
+def migrate(json_path='db.json', sqlite_path='db.sqlite3') -> int:
+    """Copies every meeting, setting and send from db.json into SQLite and
+    moves db.json aside so it is no longer picked up
+    """
+    source = TinyDBStorage(json_path)
+    target = SQLiteStorage(sqlite_path)
+    documents = source.documents()
+    with target.transaction():
+        for document in documents:
+            document = dict(document)
+            if 'type' in document:
+                target.save_meeting(document.pop('type'), document)
+            else:
+                for key, value in document.items():
+                    target.set_setting(key, value)
+        for send in source.send_documents():
+            target.record_send(send['type'], send['date'], send['service'])
+    source.db.close()
+    os.replace(json_path, f'{json_path}.migrated')
+    return len(documents)
@@ -0,0 +1,213 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as clock
+from functools import cached_property
+import json
+import os
+import re
+
+from cmbot import CMBot
+from main import Main, parse_args
+from meetings import MEETINGS
+from metrics import Metrics
+from models import MeetingType as Type
+from outbox import OutboxDrainer
+from scheduler import Scheduler
+
+
+# tenant and mailbox names become directory and file names
+NAME = re.compile(r'[\w-]+')
+
+
+class Mailbox:
+    """A Gmail account read on behalf of every tenant using it
+
+    Its bot keeps the sync state and the parsed emails in the mailbox's
+    own directory and never posts, so it needs no bot id.
+    """
+    def __init__(self, name: str, directory: str, metrics: Metrics):
+        os.makedirs(directory, exist_ok=True)
+        self.name = name
+        self.metrics = metrics
+        self.bot = CMBot(metrics=metrics, directory=directory, account=name)
+
+    def parse_latest_email(self) -> dict:
+        return self.bot.parse_latest_email()
+
+
+class Tenant(Main):
+    """One group: the mailbox its meeting emails arrive in, the meetings it
+    announces with the time to start checking for each, and where they are
+    posted
+
+    Each tenant keeps its own database, send ledger, history and outbox in
+    its directory. Its bot id and Slack URL are written to its database
+    from the registry on every start.
+    """
+    write_behind = False
+
+    def __init__(self, name: str, mailbox: Mailbox, meetings: dict, bot_id: str, slack_url: str = None,
+                 directory: str = None, metrics: Metrics = None):
+        super().__init__(vars(parse_args([])))
+        self.name = name
+        self.mailbox = mailbox
+        self.meetings = meetings
+        self.bot_id = bot_id
+        self.slack_url = slack_url
+        self.directory = directory or os.path.join('state', 'tenants', name)
+        self.metrics = metrics or self.metrics
+
+    @cached_property
+    def bot(self) -> CMBot:
+        os.makedirs(self.directory, exist_ok=True)
+        bot = CMBot(write_behind=self.write_behind, metrics=self.metrics, directory=self.directory,
+                    account=self.mailbox.name)
+        bot.db.insert_bot_id('prod', self.bot_id)
+        bot.db.set_setting('slack_url', self.slack_url)
+        return bot
+
+    @cached_property
+    def drainer(self) -> OutboxDrainer:
+        return OutboxDrainer(self.bot, timeout=0)
+
+    def start_drainer(self) -> None:
+        # the scheduler drains every outbox after each round of checks
+        pass
+
+
+class Registry:
+    def __init__(self, tenants: dict, mailboxes: dict):
+        self.tenants = tenants
+        self.mailboxes = mailboxes
+
+
+def load_registry(path='tenants.json', state_dir='state', metrics: Metrics = None) -> Registry:
+    """Reads the tenants from a JSON file shaped like
+
+        {"tenants": {"fort-wayne": {"mailbox": "cm-bot",
+                                    "groupme_bot_id": "...",
+                                    "slack_url": "https://hooks.slack.com/...",
+                                    "meetings": {"student_leader": null, "conversations": "18:00"}}}}
+
+    `meetings` maps each meeting the tenant announces to the time to start
+    checking for it, or null for the meeting's default; a list of meetings
+    uses the defaults. Tenants naming the same mailbox share it.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    metrics = metrics or Metrics()
+    tenants, mailboxes = {}, {}
+    for name, entry in config['tenants'].items():
+        mailbox = entry.get('mailbox')
+        for value in [name, mailbox]:
+            if not isinstance(value, str) or not NAME.fullmatch(value):
+                raise Exception(f'Invalid tenant or mailbox name {value!r} in {path}')
+        if not entry.get('groupme_bot_id'):
+            raise Exception(f'Tenant {name} has no groupme_bot_id')
+        if mailbox not in mailboxes:
+            mailboxes[mailbox] = Mailbox(mailbox, os.path.join(state_dir, 'mailboxes', mailbox), metrics)
+        tenants[name] = Tenant(name, mailboxes[mailbox], parse_meetings(name, entry.get('meetings', list(MEETINGS))),
+                               entry['groupme_bot_id'], entry.get('slack_url'),
+                               os.path.join(state_dir, 'tenants', name), metrics)
+    return Registry(tenants, mailboxes)
+
+
+def parse_meetings(tenant: str, meetings: list or dict) -> dict:
+    if isinstance(meetings, list):
+        meetings = dict.fromkeys(meetings)
+    schedule = {}
+    for key, check_at in meetings.items():
+        if key not in MEETINGS:
+            raise Exception(f'Unknown meeting {key!r} for tenant {tenant}')
+        check_at = clock.fromisoformat(check_at) if check_at else MEETINGS[key].check_at
+        if check_at is None:
+            raise Exception(f'No time to check for the {key} meeting of tenant {tenant}')
+        schedule[Type(key)] = check_at
+    return schedule
+
+
+class TenantScheduler(Scheduler):
+    """Runs the weekly checks of every tenant from one process
+
+    Like the daemon, each meeting is checked from its scheduled time with
+    growing intervals until that day's email announces it. The checks due
+    at the same moment share one sync per mailbox: each mailbox is read
+    once, in parallel with the others, and the tenants using it are then
+    checked concurrently against that one parse. Gmail requests grow with
+    the number of mailboxes, not with the number of groups.
+    """
+    def __init__(self, registry: Registry, poll=30, max_poll=5 * 60, workers=8):
+        super().__init__(poll, max_poll)
+        self.registry = registry
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def setup(self) -> int:
+        for mailbox in self.registry.mailboxes.values():
+            if mailbox.bot.gmail.credential_manager.get() is None:
+                print(f'Authorizing the {mailbox.name} mailbox')
+                mailbox.bot.gmail.get_new_credentials()
+        print(f'All {len(self.registry.mailboxes)} mailboxes are authorized')
+        return 0
+
+    def serve(self) -> int:
+        for tenant in self.registry.tenants.values():
+            # built before the threads share them
+            tenant.drainer
+        return super().serve()
+
+    def schedule(self) -> dict:
+        return {(tenant.name, meeting_type): (meeting_type, check_at)
+                for tenant in self.registry.tenants.values()
+                for meeting_type, check_at in tenant.meetings.items()}
+
+    def check(self, due: list, now: datetime) -> None:
+        """Reads every mailbox with a due check once, then checks the due
+        meetings of each tenant against its mailbox's latest parse
+        """
+        meeting_types = {}
+        for name, meeting_type in due:
+            meeting_types.setdefault(name, []).append(meeting_type)
+        tenants = [self.registry.tenants[name] for name in meeting_types]
+        mailboxes = list({tenant.mailbox.name: tenant.mailbox for tenant in tenants}.values())
+        parses = dict(zip([mailbox.name for mailbox in mailboxes], self.pool.map(self.fetch, mailboxes)))
+        errors = self.pool.map(lambda tenant: self.announce(tenant, meeting_types[tenant.name],
+                                                            parses[tenant.mailbox.name]), tenants)
+        for tenant, tenant_errors in zip(tenants, errors):
+            for meeting_type in meeting_types[tenant.name]:
+                key = (tenant.name, meeting_type)
+                if meeting_type in tenant_errors:
+                    self.retry(key, now, f'{tenant.name} {meeting_type.value}', tenant_errors[meeting_type])
+                else:
+                    self.succeeded(key)
+        self.outbox_ready.set()
+
+    def fetch(self, mailbox: Mailbox) -> dict or None:
+        with mailbox.metrics.run(f'{mailbox.name}/fetch'):
+            try:
+                return mailbox.parse_latest_email()
+            except Exception as e:
+                print(f'Could not read the {mailbox.name} mailbox: {e}')
+                return None
+
+    def announce(self, tenant: Tenant, meeting_types: list, parse: dict or None) -> dict:
+        """Returns the error of each meeting that could not be announced
+        """
+        errors = {}
+        for meeting_type in meeting_types:
+            with tenant.metrics.run(f'{tenant.name}/{meeting_type.value}'):
+                try:
+                    if parse is None:
+                        raise Exception(f'Could not read the {tenant.mailbox.name} mailbox')
+                    tenant.announce(meeting_type, parse)
+                except Exception as e:
+                    errors[meeting_type] = e
+        return errors
+
+    def drain(self) -> None:
+        list(self.pool.map(self.drain_tenant, self.registry.tenants.values()))
+
+    def drain_tenant(self, tenant: Tenant) -> None:
+        with tenant.metrics.run(f'{tenant.name}/drain_outbox'):
+            try:
+                tenant.drainer.drain()
+            except Exception as e:
+                print(f'Could not drain the outbox of {tenant.name}: {e}')
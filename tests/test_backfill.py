@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+import os
+from datetime import date
+from backfill import Backfill
+from history import LocationHistory
+
+
+class BackfillTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.history = LocationHistory(os.path.join(self.dir.name, 'history.sqlite3'))
+        self.settings = {}
+        self.bot = self.make_bot()
+        self.backfill = Backfill(self.bot, workers=2, history=self.history)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_run_records_locations_from_every_page(self):
+        stats = self.backfill.run()
+        assert stats['fetched'] == 3
+        assert stats['locations'] == 3
+        # every mocked email announces the same meeting, which is recorded once
+        assert len(self.history.records()) == 1
+        assert self.settings['backfill'] == {'page_token': None, 'done': ['a', 'b', 'c']}
+
+    def test_run_resumes_from_checkpoint(self):
+        self.settings['backfill'] = {'page_token': None, 'done': ['a', 'b']}
+        stats = self.backfill.run()
+        assert stats['fetched'] == 1
+        self.bot.gmail.get_email_info.assert_called_once()
+
+    def test_failed_message_keeps_page_token(self):
+        def get_email_info(service, msg_id):
+            if msg_id == 'c':
+                raise Exception('Internal error')
+            return self.email, []
+        self.bot.gmail.get_email_info.side_effect = get_email_info
+        self.backfill.run()
+        assert self.settings['backfill'] == {'page_token': 'page-2', 'done': ['a', 'b']}
+
+    def test_failed_message_keeps_page_token_past_later_pages(self):
+        def get_email_info(service, msg_id):
+            if msg_id == 'a':
+                raise Exception('Internal error')
+            return self.email, []
+        self.bot.gmail.get_email_info.side_effect = get_email_info
+        self.backfill.run()
+        assert self.settings['backfill'] == {'page_token': None, 'done': ['b', 'c']}
+
+    def test_defaults_to_the_bots_history(self):
+        assert Backfill(self.bot).history is self.bot.history
+
+    def test_newer_email_wins_for_the_same_meeting(self):
+        self.history.append('conversations', {'building': 'Walb', 'room': '222-226', 'date': '2017-08-16'})
+        # a and b are a corrected email and the original, both for 8/23; c is for 8/16
+        rooms = {'a': 'Classic Ballroom', 'b': '222', 'c': 'Classic Ballroom'}
+        dates = {'a': date(2017, 8, 23), 'b': date(2017, 8, 23), 'c': date(2017, 8, 16)}
+        self.bot.gmail.get_email_info.side_effect = \
+            lambda service, msg_id: (self.email.replace('Classic Ballroom', rooms[msg_id]), msg_id)
+        self.bot.find_date.side_effect = lambda msg_id, weekday: dates[msg_id]
+        self.backfill.run()
+        assert self.history.on('conversations', date(2017, 8, 23))['room'] == 'Classic Ballroom'
+        assert self.history.on('conversations', date(2017, 8, 16))['room'] == '222-226'
+
+    def make_bot(self):
+        bot = MagicMock()
+        bot.db.get_setting.side_effect = self.settings.get
+        bot.db.set_setting.side_effect = self.settings.__setitem__
+        bot.gmail.list_message_pages.return_value = iter([
+            ([{'id': 'a'}, {'id': 'b'}], 'page-2'),
+            ([{'id': 'c'}], None)
+        ])
+        bot.gmail.get_email_info.return_value = (self.email, [])
+        bot.find_date.return_value = date(2017, 8, 23)
+        return bot
+
+    @property
+    def email(self):
+        return 'CM "Conversations" Meeting: Wednesday, August 23rd, 7 - 8:30 pm, Walb Classic Ballroom'
@@ -0,0 +1,41 @@
+import unittest
+import tempfile
+import json
+import time
+from cache import DiscoveryCache
+
+
+class DiscoveryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = DiscoveryCache(self.dir.name, ttl=60)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_get_returns_none_when_missing(self):
+        assert self.cache.get('gmail', 'v1') is None
+
+    def test_get_returns_stored_document(self):
+        self.cache.set('gmail', 'v1', self.document)
+        assert self.cache.get('gmail', 'v1') == self.document
+
+    def test_get_returns_none_when_expired(self):
+        self.cache.set('gmail', 'v1', self.document)
+        self.cache.ttl = -1
+        assert self.cache.get('gmail', 'v1') is None
+
+    def test_get_returns_none_for_other_format_version(self):
+        self.cache.set('gmail', 'v1', self.document)
+        with open(self.cache.path('gmail', 'v1'), 'w') as f:
+            json.dump({'format': 0, 'fetched_at': time.time(), 'document': self.document}, f)
+        assert self.cache.get('gmail', 'v1') is None
+
+    def test_clear_removes_document(self):
+        self.cache.set('gmail', 'v1', self.document)
+        self.cache.clear('gmail', 'v1')
+        assert self.cache.get('gmail', 'v1') is None
+
+    @property
+    def document(self):
+        return json.dumps({'name': 'gmail', 'version': 'v1', 'revision': '20170801'})
@@ -3,15 +3,26 @@ from unittest.mock import MagicMock, ANY
 from cmbot import CMBot
 import cmbot
 import pytest
-from datetime import datetime as dt, timedelta
+from datetime import date, datetime as dt, timedelta
 import json
 import pickle
-from models import MeetingType as Type
+import os
+import tempfile
+from models import Location, MeetingType as Type
+from database import Database
+from history import LocationHistory
+from metrics import Metrics
+from storage import SQLiteStorage
 
 
 class CMBotTest(unittest.TestCase):
     def setUp(self):
-        self.bot = CMBot()
+        self.dir = tempfile.TemporaryDirectory()
+        self.bot = CMBot(metrics=Metrics(os.path.join(self.dir.name, 'metrics.jsonl')), directory=self.dir.name)
+        self.bot.db.insert_bot_id('prod', 'abc')
+
+    def tearDown(self):
+        self.dir.cleanup()
 
     def test_has_correct_attributes(self):
         for attr in self.attrs():
@@ -21,14 +32,24 @@ class CMBotTest(unittest.TestCase):
         return ['id', 'db', 'gmail']
     
     def test_build_sentence_with_location_returns_sentence(self):
-        location = {'building': 'Walb', 'room': '222-226', 'date': dt(2017, 8, 21)}
+        location = Location(date(2017, 8, 21), 'Walb', '222-226')
         sentence = self.bot.build_sentence(location)
-        assert 'The {date.month}/{date.day} meeting was held in {building} {room}'.format_map(location) == sentence
+        assert 'The 8/21 meeting was held in Walb 222-226' == sentence
 
     def test_build_sentence_with_invalid_location_returns_error_sentence(self):
-        location = {'date': dt(2017, 8, 21)}
+        location = Location(date(2017, 8, 21), None, None)
         error = self.bot.build_sentence(location)
-        assert 'There was no meeting on {date.month}/{date.day}'.format_map(location) == error
+        assert 'There was no meeting on 8/21' == error
+
+    def test_last_location_reads_dates_stored_as_dicts(self):
+        self.bot.db = MagicMock()
+        self.bot.db.last_location.return_value = {'building': 'Walb', 'room': '226', 'date': {'month': 'Aug', 'day': '21', 'year': '2017'}}
+        assert self.bot.last_location(Type.STUDENT_LEADER) == Location(date(2017, 8, 21), 'Walb', '226')
+
+    def test_find_date_corrects_to_meeting_weekday(self):
+        headers = [{'name': 'Date', 'value': 'Sun, 6 Aug 2017 09:00:00 -0500'}]
+        assert self.bot.find_date(headers) == date(2017, 8, 6)
+        assert self.bot.find_date(headers, weekday=2) == date(2017, 8, 9)
 
     def test_check_message_sent_today_returns_true_raises_exception(self):
         self.bot.db.message_sent_today = MagicMock(return_value=True)
@@ -38,30 +59,65 @@ class CMBotTest(unittest.TestCase):
     def test_check_no_student_leader_meeting_today(self):
         self.bot.is_not_day = MagicMock(return_value=True)
         with pytest.raises(Exception):
-            self.bot.check_no_student_leader_meeting_today(Type.STUDENT_LEADER)
+            self.bot.check_no_meeting_today(Type.STUDENT_LEADER)
+        self.bot.is_not_day.assert_called_with('Monday')
     
     def test_check_no_conversations_meeting_today(self):
         self.bot.is_not_day = MagicMock(return_value=True)
         with pytest.raises(Exception):
-            self.bot.check_no_conversations_meeting_today(Type.CONVERSATIONS)
+            self.bot.check_no_meeting_today(Type.CONVERSATIONS)
+        self.bot.is_not_day.assert_called_with('Wednesday')
 
     def test_student_leader_regex_raises_exception_with_no_student_leader_meeting(self):
         message = self.email_no_student_leader[0]
         with pytest.raises(Exception):
-            self.bot.extract_student_leader_room(message)
+            self.bot.extract_room(Type.STUDENT_LEADER, message)
     
     def test_conversations_regex_matches_with_no_student_leader_meeting(self):
         message = self.email_no_student_leader[0]
-        building, room = self.bot.extract_conversations_room(message)
+        building, room = self.bot.extract_room(Type.CONVERSATIONS, message)
         assert building == 'Walb'
         assert room == 'Classic Ballroom'
 
     def test_conversations_regex_matches_email_sent_tuesday(self):
         message = self.email_sent_tuesday[0]
-        building, room = self.bot.extract_conversations_room(message)
+        building, room = self.bot.extract_room(Type.CONVERSATIONS, message)
         assert building == 'Walb'
         assert room == 'Classic Ballroom'
 
+    def test_locate_parses_the_email_once_for_every_meeting_type(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.bot.db = Database(storage=SQLiteStorage(os.path.join(directory, 'db.sqlite3')))
+            self.bot.history = LocationHistory(os.path.join(directory, 'history.sqlite3'))
+            self.bot.gmail = MagicMock()
+            self.bot.gmail.get_last_email_id.return_value = 'abc'
+            self.bot.gmail.get_email_info.return_value = (self.weekly_email, [{'name': 'Date', 'value': 'Sun, 20 Aug 2017 09:00:00 -0500'}])
+            self.bot.is_today = MagicMock(return_value=True)
+
+            assert self.bot.locate(Type.STUDENT_LEADER).room == 'G21'
+            location = self.bot.locate(Type.CONVERSATIONS)
+
+            assert location == Location(date(2017, 8, 23), 'Walb', '222-226')
+            assert self.bot.db.last_location('conversations')['date'] == '2017-08-23'
+            assert self.bot.gmail.authorize.call_count == 1
+            assert self.bot.gmail.get_email_info.call_count == 1
+            assert self.bot.db.get_parse('abc')['locations']['student_leader'] == ['LA', 'G21']
+
+    def test_locate_reuses_a_stored_parse_of_the_latest_email(self):
+        self.bot.db = MagicMock()
+        self.bot.db.latest_parse.return_value = None
+        self.bot.db.get_parse.return_value = {'email_id': 'abc', 'date': '2017-08-20', 'locations': {'conversations': None}}
+        self.bot.gmail = MagicMock()
+        self.bot.is_today = MagicMock(return_value=True)
+        with pytest.raises(Exception):
+            self.bot.locate(Type.CONVERSATIONS)
+        self.bot.gmail.get_email_info.assert_not_called()
+
+    @property
+    def weekly_email(self):
+        return ('Student Leader Meeting: Monday, August 21st, noon - 1 pm, Liberal Arts, Room G21\n'
+                'CM "Conversations" Meeting: Wednesday, August 23rd, 7 - 8:30 pm, Walb, 222')
+
     @property
     def student_leader_message(self):
         return 'The Student Leader meeting will be held in Walb 226.'
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from oauth2client import client
+from credentials import CredentialManager, TokenStorage
+
+
+def make_credentials(access_token, expires_in):
+    expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=expires_in)
+    return client.OAuth2Credentials(access_token, 'client-id', 'client-secret', 'refresh-token', expiry,
+                                    'https://oauth2.googleapis.com/token', 'CM Bot')
+
+
+def fake_refresh(credentials, http):
+    credentials.access_token = 'refreshed'
+    credentials.token_expiry = make_credentials('', 3600).token_expiry
+    credentials.store.locked_put(credentials)
+
+
+class CredentialManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'cm-bot.json')
+        self.manager = CredentialManager(self.path)
+
+    def tearDown(self):
+        if self.manager.timer:
+            self.manager.timer.cancel()
+        self.dir.cleanup()
+
+    def test_returns_none_without_stored_credentials(self):
+        assert self.manager.get() is None
+
+    def test_credentials_are_read_from_disk_once(self):
+        TokenStorage(self.path).put(make_credentials('token', 3600))
+        credentials = self.manager.get()
+        os.remove(self.path)
+        assert self.manager.get() is credentials
+
+    @patch.object(client.OAuth2Credentials, '_do_refresh_request', fake_refresh)
+    def test_token_close_to_expiry_is_refreshed_and_written(self):
+        TokenStorage(self.path).put(make_credentials('old', 60))
+        credentials = self.manager.get()
+        self.manager.wait()
+        assert credentials.access_token == 'refreshed'
+        with open(self.path) as f:
+            assert json.load(f)['access_token'] == 'refreshed'
+
+    @patch.object(client.OAuth2Credentials, '_do_refresh_request')
+    def test_token_refreshed_by_another_process_is_reused(self, refresh_request):
+        storage = TokenStorage(self.path)
+        storage.put(make_credentials('old', 3600))
+        credentials = self.manager.get()
+        storage.put(make_credentials('from-other-process', 3600))
+        self.manager.refresh()
+        refresh_request.assert_not_called()
+        assert credentials.access_token == 'from-other-process'
@@ -0,0 +1,48 @@
+import unittest
+import tempfile
+import os
+from unittest.mock import MagicMock
+from datetime import datetime as dt
+from cmbot import CMBot
+from daemon import Daemon
+from models import Location, MeetingType as Type
+from metrics import Metrics
+from tests.test_main import get_arguments
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.daemon = Daemon(get_arguments(), poll=30, max_poll=60)
+        self.dir = tempfile.TemporaryDirectory()
+        self.daemon.metrics = Metrics(os.path.join(self.dir.name, 'metrics.jsonl'))
+        self.daemon.bot = CMBot(metrics=self.daemon.metrics, directory=self.dir.name)
+        self.daemon.bot.db.insert_bot_id('prod', 'abc')
+        self.daemon.post = MagicMock()
+        self.daemon.bot.db.message_sent_today = MagicMock(return_value=False)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_start_day_schedules_meetings_for_weekday(self):
+        self.daemon.start_day(dt(2017, 8, 21, 0, 0))
+        assert self.daemon.next_attempt == {Type.STUDENT_LEADER: dt(2017, 8, 21, 9, 30)}
+        self.daemon.start_day(dt(2017, 8, 22, 0, 0))
+        assert self.daemon.next_attempt == {}
+
+    def test_check_backs_off_until_email_arrives(self):
+        self.daemon.start_day(dt(2017, 8, 21, 0, 0))
+        self.daemon.bot.locate = MagicMock(side_effect=Exception('No Student Leader meeting scheduled today'))
+        now = dt(2017, 8, 21, 9, 30)
+        self.daemon.check([Type.STUDENT_LEADER], now)
+        self.daemon.check([Type.STUDENT_LEADER], now)
+        self.daemon.check([Type.STUDENT_LEADER], now)
+        assert self.daemon.next_attempt[Type.STUDENT_LEADER] == dt(2017, 8, 21, 9, 31)
+        self.daemon.post.assert_not_called()
+
+    def test_check_posts_once_email_arrives(self):
+        self.daemon.start_day(dt(2017, 8, 21, 0, 0))
+        self.daemon.bot.locate = MagicMock(return_value=Location(dt(2017, 8, 21).date(), 'Walb', '226'))
+        self.daemon.check([Type.STUDENT_LEADER], dt(2017, 8, 21, 9, 30))
+        self.daemon.post.assert_called_once_with("Today's Student Leader meeting will be held in Walb 226.",
+                                                 dt(2017, 8, 21).date())
+        assert self.daemon.next_attempt == {}
@@ -1,22 +1,40 @@
 import unittest
 from unittest import mock
 from database import Database
+import os
 import pytest
+import tempfile
 from datetime import datetime as dt, timedelta
-from models import MeetingType as Type
+from models import Location, MeetingType as Type
+from storage import SQLiteStorage, TinyDBStorage
 
 
 class DatabaseTest(unittest.TestCase):
     def setUp(self):
-        self.db = Database()
+        self.dir = tempfile.TemporaryDirectory()
+        self.db = Database(storage=SQLiteStorage(os.path.join(self.dir.name, 'db.sqlite3')))
+
+    def tearDown(self):
+        self.db.db.connection.close()
+        self.dir.cleanup()
 
     def test_has_correct_attributes(self):
         for attr in self.attrs():
             assert hasattr(self.db, attr)
     
     def attrs(self):
-        return ['db', 'q']
+        return ['db', 'setup']
     
     def test_last_location_returns_location(self):
         location = self.db.last_location(Type.STUDENT_LEADER)
         assert isinstance(location, dict)
+
+    def test_meeting_type_is_stored_under_its_value(self):
+        self.db.update_location(Location(dt(2017, 8, 21).date(), 'Walb', '226'), Type.STUDENT_LEADER)
+        assert self.db.last_location('student_leader')['room'] == '226'
+        assert self.db.meeting_type_exists(Type.STUDENT_LEADER)
+
+    def test_last_location_returns_location_from_json(self):
+        db = Database(storage=TinyDBStorage(os.path.join(self.dir.name, 'db.json')))
+        location = db.last_location(Type.STUDENT_LEADER)
+        assert isinstance(location, dict)
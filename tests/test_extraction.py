@@ -0,0 +1,53 @@
+import unittest
+import base64
+from benchmarks.extraction import compare, check, load_baseline
+from benchmarks.generate import generate, FORMATS
+from extractors import extract_all
+from gmail import Gmail
+
+
+class GenerateTest(unittest.TestCase):
+    def test_same_seed_gives_same_emails(self):
+        assert [email['raw'] for email in generate(5, seed=3)] == [email['raw'] for email in generate(5, seed=3)]
+
+    def test_covers_every_format_and_missing_meetings(self):
+        emails = generate(60)
+        assert {email['format'] for email in emails} == set(FORMATS)
+        assert any(email['expected']['student_leader'] is None for email in emails)
+        assert any(email['expected']['conversations'] is None for email in emails)
+
+    def test_extracts_generated_locations(self):
+        emails = generate(60, seed=7)
+        assert check(emails, Gmail()) == []
+
+    def test_quoted_printable_meeting_block_has_soft_breaks(self):
+        email = next(email for email in generate(60) if email['format'] == 'quoted-printable'
+                     and email['expected']['conversations'])
+        assert b'=\r\n' in email['raw']
+        text = Gmail().get_text({'raw': base64.urlsafe_b64encode(email['raw']).decode('ascii')})
+        assert extract_all(text)['conversations'] == email['expected']['conversations']
+
+
+class CompareTest(unittest.TestCase):
+    baseline = {'calibration': 0.01, 'metrics': {'pipeline': 0.002, 'pathological.near_misses': 0.3}}
+
+    def test_within_tolerance(self):
+        metrics = {'pipeline': 0.0025, 'pathological.near_misses': 0.3}
+        assert compare(metrics, 0.01, self.baseline, 0.5) == []
+
+    def test_flags_slower_metric(self):
+        metrics = {'pipeline': 0.0031, 'pathological.near_misses': 0.3}
+        assert compare(metrics, 0.01, self.baseline, 0.5) == ['pipeline']
+
+    def test_scales_by_calibration(self):
+        # a machine twice as slow is allowed twice the time
+        metrics = {'pipeline': 0.005, 'pathological.near_misses': 0.6}
+        assert compare(metrics, 0.02, self.baseline, 0.5) == []
+
+    def test_ignores_metrics_without_baseline(self):
+        assert compare({'stage.new': 1.0}, 0.01, self.baseline, 0.5) == []
+
+    def test_stored_baseline_covers_pipeline(self):
+        baseline = load_baseline()
+        assert baseline['calibration'] > 0
+        assert 'pipeline' in baseline['metrics']
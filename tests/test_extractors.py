@@ -0,0 +1,58 @@
+import unittest
+import time
+from extractors import EXTRACTORS, Extractor, Matcher, normalize, extract_all
+from models import MeetingType as Type
+
+STUDENT_LEADER = EXTRACTORS[Type.STUDENT_LEADER]
+CONVERSATIONS = EXTRACTORS[Type.CONVERSATIONS]
+
+
+class ExtractorTest(unittest.TestCase):
+    def test_student_leader_location(self):
+        message = normalize('Student Leader Meeting: Monday, August 21st, noon - 1 pm, Liberal Arts, Room G21')
+        assert STUDENT_LEADER.extract(message) == ('LA', 'G21')
+
+    def test_conversations_location(self):
+        message = normalize('CM "Conversations" Meeting: Wednesday, August 23rd, 7 - 8:30 pm, IPFW’s Walb, 222')
+        assert CONVERSATIONS.extract(message) == ('Walb', '222-226')
+
+    def test_conversations_location_in_forwarded_email(self):
+        message = normalize('> CM "Conversations" Meeting: Wednesday, August 23rd,\r\n> 7 - 8:30 pm, Walb Classic Ballroom')
+        assert CONVERSATIONS.extract(message) == ('Walb', 'Classic Ballroom')
+
+    def test_returns_none_without_meeting(self):
+        assert STUDENT_LEADER.extract('no meetings this week') is None
+        assert CONVERSATIONS.extract('cm "conversations" is on break') is None
+
+    def test_extract_all_finds_every_meeting_type(self):
+        message = 'Student Leader Meeting: Monday, August 21st, noon - 1 pm, Walb Union, Room 226'
+        assert extract_all(message) == {'student_leader': ('Walb', '226'), 'conversations': None}
+
+    def test_extract_all_finds_meetings_in_any_order(self):
+        message = ('CM "Conversations" Meeting: Wednesday, August 23rd, 7 - 8:30 pm, Walb, 222\n'
+                   'Student Leader Meeting: Monday, August 21st, noon - 1 pm, L.A., Room G-21')
+        assert extract_all(message) == {'student_leader': ('LA', 'G-21'), 'conversations': ('Walb', '222-226')}
+
+    def test_matcher_runs_every_extractor_sharing_a_literal(self):
+        first = Extractor('meeting', r'meeting\s(a)\s(\d+)', lambda building, room: (building, room))
+        second = Extractor('meeting', r'meeting\s(b)\s(\d+)', lambda building, room: (building, room))
+        matcher = Matcher({'first': first, 'second': second})
+        assert matcher.match('meeting b 2, meeting a 1') == {'first': ('a', '1'), 'second': ('b', '2')}
+
+    def test_match_after_many_near_misses(self):
+        message = 'student leader meeting: monday, ' * 500 + \
+            'student leader meeting: monday, august 21st, noon - 1 pm, walb union, room 226'
+        assert STUDENT_LEADER.extract(message) == ('Walb', '226')
+
+    def test_match_cut_off_by_window_of_earlier_hit(self):
+        block = 'student leader meeting: monday, august 21st, noon - 1 pm, walb union, room 110'
+        # an earlier 'leader' whose window ends right after 'room 11'
+        message = 'leader' + ' ' * (STUDENT_LEADER.after - len('leader') - len(block) + 1) + block + '\n'
+        assert STUDENT_LEADER.extract(message) == ('Walb', '110')
+        assert extract_all(message)['student_leader'] == ('Walb', '110')
+
+    def test_pathological_input_stays_fast(self):
+        message = ('cm "conversations" meeting: wednesday, august 23rd, 7 - 8:30 pm, walb ' + ' ' * 50) * 2000
+        start = time.perf_counter()
+        assert CONVERSATIONS.extract(message) is None
+        assert time.perf_counter() - start < 2
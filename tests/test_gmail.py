@@ -5,9 +5,189 @@ import cmbot
 import pytest
 from datetime import datetime as dt, timedelta
 from gmail import Gmail
+from cache import MessageCache
+import base64
+import tempfile
+import os
+from unittest.mock import patch
+from ratelimit import SharedRateLimiter
+import httplib2
+from apiclient import errors
 
 class GmailTest(unittest.TestCase):
     def setUp(self):
         self.gmail = Gmail()
-    
-    
\ No newline at end of file
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.gmail.message_cache = MessageCache(self.dir.name)
+        self.gmail.quota = SharedRateLimiter(os.path.join(self.dir.name, 'quota.json'), 1000, 1000)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_get_email_info_fetches_message_once(self):
+        service = self.service()
+        message, headers = self.gmail.get_email_info(service, '15e0a')
+        assert 'student leader meeting' in message
+        assert {'name': 'Date', 'value': 'Mon, 21 Aug 2017 08:00:00 -0400'} in headers
+        service.users().messages().get.assert_called_once_with(userId='me', id='15e0a', format='raw')
+
+    def test_get_email_info_uses_cache_on_rerun(self):
+        self.gmail.get_email_info(self.service(), '15e0a')
+        service = self.service()
+        self.gmail.get_email_info(service, '15e0a')
+        service.users().messages().get.assert_not_called()
+
+    def test_get_text_decodes_quoted_printable_plain_part(self):
+        text = self.gmail.get_text({'raw': self.encode(self.multipart)})
+        assert 'cm "conversations" meeting: wednesday' in text
+        assert 'walb classic ballroom' in text
+        assert 'attachment' not in text
+
+    def test_get_text_falls_back_to_html(self):
+        message = (
+            'Content-Type: text/html; charset="utf-8"\r\n'
+            '\r\n'
+            '<p>Student Leader Meeting: <b>Monday</b></p>\r\n'
+        )
+        assert self.gmail.get_text({'raw': self.encode(message)}).strip() == 'student leader meeting: monday'
+
+    def test_sync_skips_list_when_no_messages_added(self):
+        self.gmail.db = FakeDatabase(history_id='100', last_email_id='15e0a')
+        service = MagicMock()
+        service.users().history().list().execute.return_value = {'historyId': '120', 'history': []}
+        service.users().history().list_next.return_value = None
+        assert self.gmail.get_last_email_id(service) == '15e0a'
+        assert self.gmail.db.settings['history_id'] == '120'
+        service.users().messages().list.assert_not_called()
+
+    def test_sync_takes_added_weekly_email(self):
+        self.gmail.db = FakeDatabase(history_id='100', last_email_id='15e0a')
+        service = self.metadata_service('Spiritual Cyber-Vitamin')
+        service.users().history().list().execute.return_value = {'historyId': '130', 'history': [
+            {'messagesAdded': [{'message': {'id': '15f1b', 'labelIds': ['INBOX']}}]},
+            {'messagesAdded': [{'message': {'id': '15f2c', 'labelIds': ['DRAFT']}}]}
+        ]}
+        service.users().history().list_next.return_value = None
+        assert self.gmail.get_last_email_id(service) == '15f1b'
+        assert self.gmail.db.settings == {'history_id': '130', 'last_email_id': '15f1b'}
+        service.users().messages().get.assert_called_once_with(userId='me', id='15f1b', format='metadata',
+                                                               metadataHeaders=['Subject'])
+        service.users().messages().list.assert_not_called()
+        assert '15f1b' not in self.gmail.message_cache
+
+    def test_sync_keeps_last_email_when_added_message_is_not_weekly_email(self):
+        self.gmail.db = FakeDatabase(history_id='100', last_email_id='15e0a')
+        service = self.metadata_service('Lunch')
+        service.users().history().list().execute.return_value = {'historyId': '130', 'history': [
+            {'messagesAdded': [{'message': {'id': '15f1b', 'labelIds': ['INBOX']}}]}
+        ]}
+        service.users().history().list_next.return_value = None
+        assert self.gmail.get_last_email_id(service) == '15e0a'
+        assert self.gmail.db.settings['history_id'] == '130'
+        service.users().messages().list.assert_not_called()
+
+    def test_sync_lists_messages_when_several_were_added(self):
+        self.gmail.db = FakeDatabase(history_id='100', last_email_id='15e0a')
+        service = MagicMock()
+        service.users().history().list().execute.return_value = {'historyId': '130', 'history': [
+            {'messagesAdded': [{'message': {'id': '16000'}}, {'message': {'id': '16001'}}]}
+        ]}
+        service.users().history().list_next.return_value = None
+        service.users().getProfile().execute.return_value = {'historyId': '500'}
+        service.users().messages().list().execute.return_value = {'messages': [{'id': '16001'}]}
+        assert self.gmail.get_last_email_id(service) == '16001'
+        service.users().messages().get.assert_not_called()
+
+    def test_sync_lists_messages_when_history_expired(self):
+        self.gmail.db = FakeDatabase(history_id='100', last_email_id='15e0a')
+        service = MagicMock()
+        service.users().history().list().execute.side_effect = errors.HttpError(httplib2.Response({'status': 404}), b'')
+        service.users().getProfile().execute.return_value = {'historyId': '500'}
+        service.users().messages().list().execute.return_value = {'messages': [{'id': '15f1b'}]}
+        assert self.gmail.get_last_email_id(service) == '15f1b'
+        assert self.gmail.db.settings == {'history_id': '500', 'last_email_id': '15f1b'}
+
+    @patch('gmail.time.sleep')
+    def test_execute_retries_transient_errors(self, sleep):
+        request = MagicMock()
+        request.execute.side_effect = [
+            errors.HttpError(httplib2.Response({'status': 503}), b''),
+            errors.HttpError(httplib2.Response({'status': 403}), b'{"reason": "userRateLimitExceeded"}'),
+            {'messages': []}
+        ]
+        assert self.gmail.execute(request, 'messages.list') == {'messages': []}
+        assert sleep.call_count == 2
+
+    @patch('gmail.time.sleep')
+    def test_execute_raises_permanent_errors_right_away(self, sleep):
+        request = MagicMock()
+        request.execute.side_effect = errors.HttpError(httplib2.Response({'status': 404}), b'')
+        with pytest.raises(errors.HttpError):
+            self.gmail.execute(request, 'messages.get')
+        sleep.assert_not_called()
+
+    @patch('gmail.time.sleep')
+    def test_execute_gives_up_after_retries(self, sleep):
+        request = MagicMock()
+        request.execute.side_effect = errors.HttpError(httplib2.Response({'status': 500}), b'')
+        with pytest.raises(errors.HttpError):
+            self.gmail.execute(request, 'messages.get')
+        assert request.execute.call_count == self.gmail.RETRIES + 1
+
+    def metadata_service(self, subject):
+        service = MagicMock()
+        service.users().messages().get().execute.return_value = {
+            'id': '15f1b', 'payload': {'headers': [{'name': 'Subject', 'value': subject}]}}
+        service.users().messages().get.reset_mock()
+        return service
+
+    def service(self):
+        service = MagicMock()
+        service.users().messages().get().execute.return_value = {'id': '15e0a', 'raw': self.raw}
+        service.users().messages().get.reset_mock()
+        return service
+
+    def encode(self, message):
+        return base64.urlsafe_b64encode(message.encode('utf-8')).decode('ascii')
+
+    @property
+    def multipart(self):
+        return (
+            'Date: Tue, 22 Aug 2017 08:00:00 -0400\r\n'
+            'Content-Type: multipart/mixed; boundary="outer"\r\n'
+            '\r\n'
+            '--outer\r\n'
+            'Content-Type: text/plain; charset="utf-8"\r\n'
+            'Content-Transfer-Encoding: quoted-printable\r\n'
+            '\r\n'
+            'CM =22Conversations=22 Meeting: Wednesday, August 23rd, 7 - 8:30 pm, IPFW\'s Walb Cla=\r\n'
+            'ssic Ballroom\r\n'
+            '--outer\r\n'
+            'Content-Type: text/plain; name="flyer.txt"\r\n'
+            'Content-Disposition: attachment; filename="flyer.txt"\r\n'
+            '\r\n'
+            'Attachment text\r\n'
+            '--outer--\r\n'
+        )
+
+    @property
+    def raw(self):
+        message = (
+            'Date: Mon, 21 Aug 2017 08:00:00 -0400\r\n'
+            'Subject: Spiritual Cyber-Vitamin\r\n'
+            '\r\n'
+            'Student Leader Meeting: Monday, August 21st, noon - 1 pm, Walb Union, Room 226\r\n'
+        )
+        return base64.urlsafe_b64encode(message.encode('utf-8')).decode('ascii')
+
+
+class FakeDatabase:
+    def __init__(self, **settings):
+        self.settings = settings
+
+    def get_setting(self, key):
+        return self.settings.get(key)
+
+    def set_setting(self, key, value):
+        self.settings[key] = value
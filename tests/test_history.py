@@ -0,0 +1,40 @@
+import unittest
+import tempfile
+import os
+from datetime import date
+from history import LocationHistory
+
+
+class LocationHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'history.sqlite3')
+        self.history = LocationHistory(self.path)
+        for day, room in [(23, 'Classic Ballroom'), (9, '222-226'), (16, 'Classic Ballroom')]:
+            self.history.append('conversations', {'building': 'Walb', 'room': room, 'date': f'2017-08-{day:02}'})
+        self.history.append('student_leader', {'building': 'LA', 'room': 'G21', 'date': '2017-08-21'})
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_on_returns_location_for_date(self):
+        location = self.history.on('conversations', date(2017, 8, 9))
+        assert location['room'] == '222-226'
+
+    def test_on_returns_none_without_meeting(self):
+        assert self.history.on('conversations', date(2017, 8, 21)) is None
+
+    def test_between_returns_sorted_range(self):
+        locations = self.history.between('conversations', date(2017, 8, 10), date(2017, 8, 23))
+        assert [location['date'] for location in locations] == ['2017-08-16', '2017-08-23']
+
+    def test_latest_record_wins(self):
+        self.history.append('conversations', {'building': 'Walb', 'room': '222-226', 'date': '2017-08-23'})
+        reloaded = LocationHistory(self.path)
+        assert reloaded.on('conversations', date(2017, 8, 23))['room'] == '222-226'
+        assert self.history.on('conversations', date(2017, 8, 23))['room'] == '222-226'
+
+    def test_room_counts(self):
+        counts = self.history.room_counts('conversations')
+        assert counts[('Walb', 'Classic Ballroom')] == 2
+        assert counts[('Walb', '222-226')] == 1
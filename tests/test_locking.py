@@ -0,0 +1,33 @@
+import unittest
+import tempfile
+import os
+import threading
+from locking import atomic_write
+
+
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'gmail-v1.discovery.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_threads_writing_one_path_do_not_collide(self):
+        errors = []
+
+        def write(text):
+            try:
+                for _ in range(50):
+                    atomic_write(self.path, text, fsync=False)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=write, args=(str(i) * 100,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        with open(self.path) as f:
+            assert f.read() in [str(i) * 100 for i in range(4)]
+        assert os.listdir(self.dir.name) == ['gmail-v1.discovery.json']
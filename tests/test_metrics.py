@@ -0,0 +1,92 @@
+import unittest
+import tempfile
+import os
+import json
+from metrics import Metrics, MetricsReader
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'metrics.jsonl')
+        self.metrics = Metrics(self.path)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_run_writes_one_record_with_every_span(self):
+        with self.metrics.run('conversations'):
+            with self.metrics.span('fetch'):
+                pass
+            with self.metrics.span('extract'):
+                pass
+        record, = self.records()
+        assert record['command'] == 'conversations'
+        assert record['ok'] is True
+        assert [span['stage'] for span in record['spans']] == ['fetch', 'extract']
+
+    def test_failed_span_is_recorded(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.run('student_leader'), self.metrics.span('list'):
+                raise ValueError()
+        record, = self.records()
+        assert record['ok'] is False
+        assert record['spans'][0]['ok'] is False
+
+    def test_runs_without_spans_and_spans_outside_runs_are_not_logged(self):
+        with self.metrics.run('student_leader'):
+            pass
+        with self.metrics.span('fetch'):
+            pass
+        assert not os.path.exists(self.path)
+
+    def test_reader_renders_histograms_of_new_runs(self):
+        reader = MetricsReader(self.path)
+        self.write_run(0.003)
+        text = reader.render()
+        assert 'cmbot_stage_seconds_bucket{stage="fetch",le="0.001"} 0' in text
+        assert 'cmbot_stage_seconds_bucket{stage="fetch",le="0.005"} 1' in text
+        self.write_run(0.2)
+        text = reader.render()
+        assert 'cmbot_stage_seconds_bucket{stage="fetch",le="+Inf"} 2' in text
+        assert 'cmbot_stage_seconds_count{stage="fetch"} 2' in text
+        assert 'cmbot_run_seconds_count{command="conversations"} 2' in text
+
+    def test_write_rotates_full_file(self):
+        self.metrics.max_bytes = 1
+        self.write_run(0.003)
+        self.write_run(0.2)
+        assert len(self.records()) == 1
+        assert os.path.exists(f'{self.path}.1')
+
+    def test_reader_follows_rotation(self):
+        self.metrics.max_bytes = 1
+        reader = MetricsReader(self.path)
+        self.write_run(0.003)
+        reader.render()
+        # the second write rotates the first run out before the reader sees the third
+        self.write_run(0.2)
+        text = reader.render()
+        assert 'cmbot_stage_seconds_count{stage="fetch"} 2' in text
+        self.write_run(0.2)
+        text = reader.render()
+        assert 'cmbot_stage_seconds_count{stage="fetch"} 3' in text
+
+    def test_reader_rereads_truncated_file(self):
+        reader = MetricsReader(self.path)
+        self.write_run(0.003)
+        self.write_run(0.003)
+        reader.render()
+        with open(self.path, 'w'):
+            pass
+        self.write_run(0.2)
+        text = reader.render()
+        assert 'cmbot_stage_seconds_count{stage="fetch"} 3' in text
+
+    def write_run(self, seconds):
+        self.metrics.write({'command': 'conversations', 'seconds': seconds, 'ok': True,
+                            'spans': [{'stage': 'fetch', 'seconds': seconds, 'ok': True}]})
+
+    def records(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import MagicMock, ANY
+import json
+import requests
+from models import Service
+from notifier import Notifier, GROUPME_URL
+
+
+class NotifierTest(unittest.TestCase):
+    def setUp(self):
+        self.notifier = Notifier('abc', slack_url)
+        for session in self.notifier.sessions.values():
+            session.post = MagicMock()
+
+    def test_services_without_slack_url(self):
+        assert Notifier('abc').services == [Service.GROUPME]
+
+    def test_deliver_posts_to_every_service(self):
+        results = self.notifier.deliver('Hello')
+        assert results == {Service.GROUPME: True, Service.SLACK: True}
+        self.notifier.sessions[Service.GROUPME].post.assert_called_once_with(
+            GROUPME_URL, data={'bot_id': 'abc', 'text': 'Hello'}, timeout=ANY)
+        self.notifier.sessions[Service.SLACK].post.assert_called_once_with(
+            slack_url, data={'payload': json.dumps({'text': 'Hello'})}, timeout=ANY)
+
+    def test_deliver_reports_failed_service(self):
+        self.notifier.sessions[Service.SLACK].post.side_effect = requests.Timeout()
+        results = self.notifier.deliver('Hello')
+        assert results == {Service.GROUPME: True, Service.SLACK: False}
+
+    def test_deliver_only_to_given_services(self):
+        results = self.notifier.deliver('Hello', [Service.SLACK])
+        assert results == {Service.SLACK: True}
+        self.notifier.sessions[Service.GROUPME].post.assert_not_called()
+
+    def test_sessions_retry_with_backoff(self):
+        retry = self.notifier.sessions[Service.GROUPME].get_adapter(GROUPME_URL).max_retries
+        assert retry.total == 3
+        assert 503 in retry.status_forcelist
+
+
+slack_url = 'https://hooks.slack.com/services/T000/B000/XXXX'
@@ -0,0 +1,40 @@
+import unittest
+import tempfile
+import os
+from models import Service
+from outbox import Outbox
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.outbox = Outbox(os.path.join(self.dir.name, 'outbox.sqlite3'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_enqueue_is_idempotent(self):
+        assert self.outbox.enqueue('conversations', '2017-08-23', 'Hello', [Service.GROUPME, Service.SLACK]) == 2
+        assert self.outbox.enqueue('conversations', '2017-08-23', 'Hello', [Service.GROUPME]) == 0
+        assert self.outbox.pending() == 2
+
+    def test_delivered_entry_is_no_longer_due(self):
+        self.outbox.enqueue('conversations', '2017-08-23', 'Hello', [Service.GROUPME])
+        entry = self.outbox.next_due()
+        self.outbox.mark_delivered(entry['id'])
+        assert self.outbox.next_due() is None
+        assert self.outbox.pending('conversations', '2017-08-23') == 0
+
+    def test_failed_entry_is_retried_later(self):
+        self.outbox.MAX_BACKOFF = 60
+        self.outbox.enqueue('conversations', '2017-08-23', 'Hello', [Service.GROUPME])
+        entry = self.outbox.next_due()
+        self.outbox.mark_failed(entry['id'], 10)
+        assert self.outbox.pending() == 1
+        assert self.outbox.seconds_until_next() <= 60
+
+    def test_due_for_lists_one_meetings_entries(self):
+        self.outbox.enqueue('conversations', '2017-08-23', 'Hello', [Service.GROUPME, Service.SLACK])
+        self.outbox.enqueue('conversations', '2017-08-30', 'Hello', [Service.GROUPME])
+        entries = self.outbox.due_for('conversations', '2017-08-23')
+        assert [entry['service'] for entry in entries] == ['GroupMe', 'Slack']
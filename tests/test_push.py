@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import MagicMock, ANY
+from datetime import date
+import tempfile
+import os
+from metrics import Metrics
+from models import MeetingType as Type
+from publish import envelope
+from push import PushListener
+
+
+class PushListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.main = MagicMock()
+        self.main.metrics = Metrics(os.path.join(self.dir.name, 'metrics.jsonl'))
+        self.listener = PushListener(self.main, 'projects/cm-bot/topics/gmail')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_notify_accepts_gmail_notification(self):
+        assert self.listener.notify(envelope('me@example.com', 4321))
+        assert self.listener.history_id == 4321
+        assert self.listener.pending.is_set()
+
+    def test_notify_rejects_malformed_envelope(self):
+        assert not self.listener.notify({'message': {'data': 'not base64 json'}})
+        assert not self.listener.notify({})
+        assert not self.listener.pending.is_set()
+
+    def test_handle_announces_only_meetings_held_today(self):
+        assert self.listener.handle(date(2017, 8, 23)) == [Type.CONVERSATIONS]
+        self.main.bot.parse_latest_email.assert_called_once()
+        self.main.announce.assert_called_once_with(Type.CONVERSATIONS)
+
+    def test_handle_parses_email_on_other_days_without_announcing(self):
+        assert self.listener.handle(date(2017, 8, 20)) == []
+        self.main.bot.parse_latest_email.assert_called_once()
+        self.main.announce.assert_not_called()
+
+    def test_handle_survives_email_for_another_day(self):
+        self.main.announce.side_effect = Exception('No Student Leader meeting scheduled today')
+        assert self.listener.handle(date(2017, 8, 21)) == []
+
+    def test_synced_when_stored_history_covers_notification(self):
+        self.main.bot.db.get_setting.return_value = '4321'
+        self.listener.notify(envelope('me@example.com', 4321))
+        assert self.listener.synced()
+        self.listener.notify(envelope('me@example.com', 4322))
+        assert not self.listener.synced()
+
+    def test_not_synced_without_stored_history(self):
+        self.main.bot.db.get_setting.return_value = None
+        self.listener.notify(envelope('me@example.com', 4321))
+        assert not self.listener.synced()
+
+    def test_renew_uses_its_own_service(self):
+        self.main.bot.gmail.watch.return_value = {'historyId': '100', 'expiration': '1503900000000'}
+        self.listener.renew()
+        self.main.bot.gmail.build_service.assert_called_once()
+        self.main.bot.gmail.authorize.assert_not_called()
+        self.main.bot.gmail.watch.assert_called_once_with(self.main.bot.gmail.build_service.return_value, ANY)
+
+    def test_renew_stores_watch_expiration(self):
+        self.main.bot.gmail.watch.return_value = {'historyId': '100', 'expiration': '1503900000000'}
+        self.listener.renew()
+        self.main.bot.gmail.watch.assert_called_once_with(ANY, 'projects/cm-bot/topics/gmail')
+        setting = self.main.bot.db.set_setting.call_args[0]
+        assert setting[0] == 'watch'
+        assert setting[1]['expires'] == 1503900000
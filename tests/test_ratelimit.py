@@ -0,0 +1,29 @@
+import unittest
+import tempfile
+import os
+from unittest.mock import patch
+from ratelimit import SharedRateLimiter
+
+
+class SharedRateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'quota.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_calls_within_burst_do_not_wait(self):
+        limiter = SharedRateLimiter(self.path, rate=10, burst=10)
+        assert sum(limiter.wait(5) for _ in range(2)) == 0
+
+    def test_budget_is_shared_through_the_file(self):
+        first = SharedRateLimiter(self.path, rate=100, burst=10)
+        second = SharedRateLimiter(self.path, rate=100, burst=10)
+        first.wait(10)
+        assert second.wait(5) > 0.04
+
+    @patch('locking.os.fsync')
+    def test_token_count_is_not_synced_to_disk(self, fsync):
+        SharedRateLimiter(self.path, rate=10, burst=10).wait()
+        fsync.assert_not_called()
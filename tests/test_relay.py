@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import MagicMock
+from relay import SlackRelay
+
+
+class SlackRelayTest(unittest.TestCase):
+    def setUp(self):
+        self.send = MagicMock(return_value=True)
+        self.relay = SlackRelay(self.send, window=0.2)
+        self.relay.start()
+
+    def test_messages_in_window_are_coalesced(self):
+        for text in ['Cam - hi', 'Sam - hello', 'Pam - hey']:
+            self.relay.enqueue(text)
+        self.relay.queue.join()
+        self.send.assert_called_once_with('Cam - hi\nSam - hello\nPam - hey')
+        assert self.relay.stats()['delivered'] == 3
+        assert self.relay.stats()['batches'] == 1
+
+    def test_failed_post_is_counted(self):
+        self.send.return_value = False
+        self.relay.enqueue('Cam - hi')
+        self.relay.queue.join()
+        stats = self.relay.stats()
+        assert stats['failed'] == 1
+        assert stats['queue_depth'] == 0
+
+    def test_relay_keeps_running_after_send_raises(self):
+        self.send.side_effect = [Exception('Connection reset'), True]
+        self.relay.enqueue('Cam - hi')
+        self.relay.queue.join()
+        self.relay.enqueue('Sam - hello')
+        self.relay.queue.join()
+        stats = self.relay.stats()
+        assert stats['failed'] == 1
+        assert stats['delivered'] == 1
@@ -0,0 +1,50 @@
+import unittest
+from benchmarks.replay import FakeServices, replay, summarize, percentile
+
+
+class ReplayTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.runs = replay()
+
+    def test_first_run_per_email_fetches_it_once(self):
+        for run in self.runs[::2]:
+            assert run['requests']['gmail.messages.get'] == 1
+            assert run['requests']['gmail.messages.list'] == 1
+
+    def test_later_runs_use_stored_parse_without_gmail(self):
+        for run in self.runs[1::2]:
+            assert not any(name.startswith('gmail.') for name in run['requests'])
+
+    def test_found_meetings_are_posted_everywhere(self):
+        for run in self.runs:
+            if run['ok']:
+                assert run['requests']['groupme.post'] == 1
+                assert run['requests']['slack.post'] == 1
+
+    def test_email_without_meeting_posts_nothing(self):
+        run = next(run for run in self.runs if not run['ok'])
+        assert run['email'] == '2017-10-02.eml'
+        assert run['meeting_type'] == 'student_leader'
+        assert 'groupme.post' not in run['requests']
+
+    def test_no_unexpected_requests(self):
+        assert all('unexpected' not in run['requests'] for run in self.runs)
+
+    def test_summarize(self):
+        summary = summarize(self.runs)
+        assert summary['runs'] == 6
+        assert summary['failed'] == 1
+        assert summary['latency_ms']['p50'] <= summary['latency_ms']['max']
+
+    def test_percentile(self):
+        assert percentile([1, 2, 3, 4], 50) == 2
+        assert percentile([1, 2, 3, 4], 99) == 4
+        assert percentile([5], 90) == 5
+
+    def test_fake_gmail_answers_metadata_with_requested_headers(self):
+        services = FakeServices()
+        msg_id = services.deliver(b'Subject: Spiritual Cyber-Vitamin\r\nDate: Mon, 21 Aug 2017 08:00:00 -0400\r\n\r\nHi\r\n')
+        status, body = services.gmail_messages_get({'format': ['metadata'], 'metadataHeaders': ['Subject']}, msg_id)
+        assert status == 200
+        assert body['payload']['headers'] == [{'name': 'Subject', 'value': 'Spiritual Cyber-Vitamin'}]
@@ -0,0 +1,36 @@
+import unittest
+import tempfile
+import os
+from sqlitedb import SQLiteDatabase
+
+
+class Numbers(SQLiteDatabase):
+    SCHEMA = 'CREATE TABLE IF NOT EXISTS numbers (n INTEGER PRIMARY KEY);'
+
+
+class SQLiteDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db = Numbers(os.path.join(self.dir.name, 'numbers.sqlite3'))
+
+    def tearDown(self):
+        self.db.connection.close()
+        self.dir.cleanup()
+
+    def count(self):
+        return self.db.connection.execute('SELECT COUNT(*) FROM numbers').fetchone()[0]
+
+    def test_nested_transactions_join_the_outermost_one(self):
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self.db.connection.execute('INSERT INTO numbers VALUES (1)')
+                with self.db.transaction():
+                    self.db.connection.execute('INSERT INTO numbers VALUES (2)')
+                raise ValueError
+        assert self.count() == 0
+
+    def test_transaction_commits(self):
+        with self.db.transaction():
+            self.db.connection.execute('INSERT INTO numbers VALUES (1)')
+        assert self.count() == 1
+        assert self.db.connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
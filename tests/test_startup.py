@@ -0,0 +1,8 @@
+import unittest
+from benchmarks.startup import measure, heavy_imports, LOCAL_COMMANDS
+
+
+class StartupTest(unittest.TestCase):
+    def test_local_commands_do_not_import_network_dependencies(self):
+        for command in LOCAL_COMMANDS:
+            assert heavy_imports(measure(command)) == []
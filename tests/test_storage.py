@@ -0,0 +1,109 @@
+import unittest
+import tempfile
+import os
+from multiprocessing import Process
+from storage import TinyDBStorage, SQLiteStorage, WriteBehindStorage, migrate
+
+
+class StorageTests:
+    def test_save_meeting_creates_and_merges(self):
+        self.storage.save_meeting('conversations', {'building': 'Walb', 'sent': False})
+        self.storage.save_meeting('conversations', {'sent': True})
+        assert self.storage.get_meeting('conversations') == {'type': 'conversations', 'building': 'Walb', 'sent': True}
+
+    def test_get_meeting_returns_none_when_missing(self):
+        assert self.storage.get_meeting('student_leader') is None
+
+    def test_settings(self):
+        assert not self.storage.has_setting('slack_url')
+        self.storage.set_setting('slack_url', None)
+        assert self.storage.has_setting('slack_url')
+        self.storage.set_setting('prod', 'abc')
+        assert self.storage.get_setting('prod') == 'abc'
+
+
+    def test_send_ledger_is_idempotent(self):
+        assert self.storage.record_send('conversations', '2017-08-23', 'GroupMe')
+        assert not self.storage.record_send('conversations', '2017-08-23', 'GroupMe')
+        self.storage.record_send('conversations', '2017-08-23', 'Slack')
+        self.storage.record_send('conversations', '2017-08-30', 'GroupMe')
+        assert self.storage.sent_services('conversations', '2017-08-23') == ['GroupMe', 'Slack']
+        assert self.storage.sent_services('student_leader', '2017-08-23') == []
+
+
+class ProcessSafeStorageTests:
+    def test_concurrent_writers_do_not_lose_updates(self):
+        self.storage.set_setting('counter', 0)
+        writers = [Process(target=increment, args=(type(self.storage), self.storage.path, 25)) for _ in range(3)]
+        for process in writers:
+            process.start()
+        for process in writers:
+            process.join()
+        assert self.storage.get_setting('counter') == 75
+
+
+def increment(storage_class, path, times):
+    storage = storage_class(path)
+    for _ in range(times):
+        with storage.transaction():
+            storage.set_setting('counter', storage.get_setting('counter') + 1)
+
+
+class TinyDBStorageTest(StorageTests, ProcessSafeStorageTests, unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.storage = TinyDBStorage(os.path.join(self.dir.name, 'db.json'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+class SQLiteStorageTest(StorageTests, ProcessSafeStorageTests, unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.storage = SQLiteStorage(os.path.join(self.dir.name, 'db.sqlite3'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+
+class WriteBehindStorageTest(StorageTests, unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.backend = SQLiteStorage(os.path.join(self.dir.name, 'db.sqlite3'))
+        self.storage = WriteBehindStorage(self.backend)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_writes_reach_backend_on_flush(self):
+        self.storage.save_meeting('conversations', {'sent': True})
+        self.storage.set_setting('prod', 'abc')
+        assert self.backend.get_meeting('conversations') is None
+        self.storage.flush()
+        assert self.backend.get_meeting('conversations') == {'type': 'conversations', 'sent': True}
+        assert self.backend.get_setting('prod') == 'abc'
+
+
+class MigrateTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.dir.name, 'db.json')
+        self.sqlite_path = os.path.join(self.dir.name, 'db.sqlite3')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_migrate_copies_meetings_and_settings(self):
+        source = TinyDBStorage(self.json_path)
+        source.set_setting('prod', 'abc')
+        source.save_meeting('conversations', {'building': 'Walb', 'sent': True})
+        source.record_send('conversations', '2017-08-23', 'GroupMe')
+        source.db.close()
+
+        assert migrate(self.json_path, self.sqlite_path) == 2
+        target = SQLiteStorage(self.sqlite_path)
+        assert target.sent_services('conversations', '2017-08-23') == ['GroupMe']
+        assert target.get_setting('prod') == 'abc'
+        assert target.get_meeting('conversations') == {'type': 'conversations', 'building': 'Walb', 'sent': True}
+        assert not os.path.exists(self.json_path)
@@ -0,0 +1,110 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import date, datetime, time as clock
+import json
+import os
+import tempfile
+import pytest
+from metrics import Metrics
+from models import MeetingType as Type
+from tenants import TenantScheduler, load_registry, parse_meetings
+
+
+class TenantsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'tenants.json')
+        self.write({
+            'fort-wayne': {'mailbox': 'cm-bot', 'groupme_bot_id': 'fw-bot', 'slack_url': 'https://hooks.slack.com/fw',
+                           'meetings': {'student_leader': None, 'conversations': '18:00'}},
+            'west-lafayette': {'mailbox': 'cm-bot', 'groupme_bot_id': 'wl-bot', 'meetings': ['conversations']},
+            'bloomington': {'mailbox': 'iu-cm', 'groupme_bot_id': 'iu-bot'}
+        })
+        self.registry = self.load()
+        self.scheduler = TenantScheduler(self.registry)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, tenants: dict):
+        with open(self.path, 'w') as f:
+            json.dump({'tenants': tenants}, f)
+
+    def load(self):
+        return load_registry(self.path, os.path.join(self.dir.name, 'state'),
+                             Metrics(os.path.join(self.dir.name, 'metrics.jsonl')))
+
+    def test_tenants_with_same_mailbox_share_it(self):
+        tenants = self.registry.tenants
+        assert sorted(self.registry.mailboxes) == ['cm-bot', 'iu-cm']
+        assert tenants['fort-wayne'].mailbox is tenants['west-lafayette'].mailbox
+
+    def test_meeting_schedules(self):
+        tenants = self.registry.tenants
+        assert tenants['fort-wayne'].meetings == {Type.STUDENT_LEADER: clock(9, 30), Type.CONVERSATIONS: clock(18, 0)}
+        assert tenants['west-lafayette'].meetings == {Type.CONVERSATIONS: clock(18, 15)}
+        assert set(tenants['bloomington'].meetings) == set(Type)
+
+    def test_unknown_meeting_raises(self):
+        with pytest.raises(Exception, match='Unknown meeting'):
+            parse_meetings('fort-wayne', ['bible_study'])
+
+    def test_invalid_name_raises(self):
+        self.write({'../etc': {'mailbox': 'cm-bot', 'groupme_bot_id': 'x'}})
+        with pytest.raises(Exception, match='Invalid'):
+            self.load()
+
+    def test_tenant_bot_is_provisioned_in_its_own_directory(self):
+        bot = self.registry.tenants['fort-wayne'].bot
+        assert bot.id == 'fw-bot'
+        assert bot.db.slack_url == 'https://hooks.slack.com/fw'
+        assert bot.outbox.path == os.path.join(self.dir.name, 'state', 'tenants', 'fort-wayne', 'outbox.sqlite3')
+        assert self.registry.tenants['west-lafayette'].bot.db.slack_url is None
+
+    def test_start_day_schedules_meetings_held_that_day(self):
+        self.scheduler.start_day(datetime(2017, 8, 23, 0, 0))
+        assert self.scheduler.next_attempt == {
+            ('fort-wayne', Type.CONVERSATIONS): datetime(2017, 8, 23, 18, 0),
+            ('west-lafayette', Type.CONVERSATIONS): datetime(2017, 8, 23, 18, 15),
+            ('bloomington', Type.CONVERSATIONS): datetime(2017, 8, 23, 18, 15)
+        }
+
+    def test_check_reads_each_mailbox_once_for_all_tenants(self):
+        self.start_conversations_day()
+        self.scheduler.check(list(self.scheduler.next_attempt), datetime.now())
+
+        for mailbox in self.registry.mailboxes.values():
+            mailbox.parse_latest_email.assert_called_once()
+        assert self.scheduler.next_attempt == {}
+        for tenant in self.registry.tenants.values():
+            assert tenant.bot.outbox.pending() == len(tenant.bot.notifier.services)
+        assert self.scheduler.outbox_ready.is_set()
+
+    def test_check_backs_off_when_mailbox_cannot_be_read(self):
+        self.start_conversations_day()
+        self.registry.mailboxes['iu-cm'].parse_latest_email.side_effect = Exception('Gmail is down')
+        now = datetime.now()
+        self.scheduler.check(list(self.scheduler.next_attempt), now)
+
+        key = ('bloomington', Type.CONVERSATIONS)
+        assert list(self.scheduler.next_attempt) == [key]
+        assert self.scheduler.delay[key] == 2 * self.scheduler.poll
+        assert self.registry.tenants['bloomington'].bot.outbox.pending() == 0
+
+    def test_check_skips_meetings_already_sent(self):
+        self.start_conversations_day()
+        tenant = self.registry.tenants['west-lafayette']
+        tenant.bot.db.record_send(Type.CONVERSATIONS.value, date.today().isoformat(), 'GroupMe')
+        self.scheduler.check(list(self.scheduler.next_attempt), datetime.now())
+        assert tenant.bot.outbox.pending() == 0
+        assert self.scheduler.next_attempt == {}
+
+    def start_conversations_day(self):
+        self.scheduler.start_day(datetime(2017, 8, 23, 0, 0))
+        parse = {'email_id': '15e0a', 'date': '2017-08-21',
+                 'locations': {'student_leader': None, 'conversations': ('Walb', 'Classic Ballroom')}}
+        for mailbox in self.registry.mailboxes.values():
+            mailbox.parse_latest_email = MagicMock(return_value=parse)
+        for tenant in self.registry.tenants.values():
+            # the parse is for 8/23, whatever day the test runs on
+            tenant.bot.is_today = MagicMock(return_value=True)